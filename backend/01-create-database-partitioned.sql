@@ -0,0 +1,68 @@
+-- Create database schema for transaction network system (monthly partitioned transactions)
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+-- Users/Accounts table
+CREATE TABLE IF NOT EXISTS accounts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    account_number VARCHAR(50) UNIQUE NOT NULL,
+    account_type VARCHAR(20) NOT NULL,
+    balance DECIMAL(15,2) DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_suspicious BOOLEAN DEFAULT FALSE,
+    risk_score DECIMAL(5,2) DEFAULT 0
+);
+
+-- Transactions table, range partitioned by month on timestamp.
+-- Partition keys must be part of every unique constraint, so the primary key is (id, timestamp)
+-- and timestamp is NOT NULL. Monthly partitions are created by partition_manager.py.
+CREATE TABLE IF NOT EXISTS transactions (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    from_account_id UUID REFERENCES accounts(id),
+    to_account_id UUID REFERENCES accounts(id),
+    amount DECIMAL(15,2) NOT NULL,
+    transaction_type VARCHAR(50) NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    description TEXT,
+    is_anomaly BOOLEAN DEFAULT FALSE,
+    anomaly_score DECIMAL(5,2) DEFAULT 0,
+    anomaly_reasons TEXT[],
+    detection_time TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Catches rows outside the created monthly ranges
+CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;
+
+-- Anomaly detection results
+CREATE TABLE IF NOT EXISTS anomaly_detections (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    -- No foreign key: transactions(id) alone is not unique across partitions, and archived
+    -- partitions take their detections with them (see partition_manager.py)
+    transaction_id UUID NOT NULL,
+    detection_method VARCHAR(100) NOT NULL,
+    anomaly_score DECIMAL(5,2) NOT NULL,
+    confidence DECIMAL(5,2) NOT NULL,
+    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(20) DEFAULT 'pending'
+);
+
+-- Incremental detection progress: last (timestamp, id) scored per detector
+CREATE TABLE IF NOT EXISTS detection_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_timestamp TIMESTAMP,
+    last_id UUID,
+    rows_scored BIGINT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create indexes for performance
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp_id ON transactions(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_from_account ON transactions(from_account_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_to_account ON transactions(to_account_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_anomaly ON transactions(is_anomaly);
+-- Keyset pagination of /api/anomalies; /api/transactions uses idx_transactions_timestamp_id backwards
+CREATE INDEX IF NOT EXISTS idx_transactions_anomaly_score_id ON transactions(anomaly_score DESC, id DESC) WHERE is_anomaly;
+CREATE INDEX IF NOT EXISTS idx_transactions_detection_time ON transactions(detection_time);
+CREATE INDEX IF NOT EXISTS idx_anomaly_detections_transaction ON anomaly_detections(transaction_id);
+CREATE INDEX IF NOT EXISTS idx_accounts_suspicious ON accounts(is_suspicious);
@@ -2,7 +2,7 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- Users/Accounts table
-CREATE TABLE accounts (
+CREATE TABLE IF NOT EXISTS accounts (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     account_number VARCHAR(50) UNIQUE NOT NULL,
     account_type VARCHAR(20) NOT NULL,
@@ -13,7 +13,7 @@ CREATE TABLE accounts (
 );
 
 -- Transactions table
-CREATE TABLE transactions (
+CREATE TABLE IF NOT EXISTS transactions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     from_account_id UUID REFERENCES accounts(id),
     to_account_id UUID REFERENCES accounts(id),
@@ -23,11 +23,12 @@ CREATE TABLE transactions (
     description TEXT,
     is_anomaly BOOLEAN DEFAULT FALSE,
     anomaly_score DECIMAL(5,2) DEFAULT 0,
-    anomaly_reasons TEXT[]
+    anomaly_reasons TEXT[],
+    detection_time TIMESTAMP
 );
 
 -- Anomaly detection results
-CREATE TABLE anomaly_detections (
+CREATE TABLE IF NOT EXISTS anomaly_detections (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     transaction_id UUID REFERENCES transactions(id),
     detection_method VARCHAR(100) NOT NULL,
@@ -37,9 +38,22 @@ CREATE TABLE anomaly_detections (
     status VARCHAR(20) DEFAULT 'pending'
 );
 
+-- Incremental detection progress: last (timestamp, id) scored per detector
+CREATE TABLE IF NOT EXISTS detection_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_timestamp TIMESTAMP,
+    last_id UUID,
+    rows_scored BIGINT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for performance
-CREATE INDEX idx_transactions_timestamp ON transactions(timestamp);
-CREATE INDEX idx_transactions_from_account ON transactions(from_account_id);
-CREATE INDEX idx_transactions_to_account ON transactions(to_account_id);
-CREATE INDEX idx_transactions_anomaly ON transactions(is_anomaly);
-CREATE INDEX idx_accounts_suspicious ON accounts(is_suspicious);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp_id ON transactions(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_from_account ON transactions(from_account_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_to_account ON transactions(to_account_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_anomaly ON transactions(is_anomaly);
+-- Keyset pagination of /api/anomalies; /api/transactions uses idx_transactions_timestamp_id backwards
+CREATE INDEX IF NOT EXISTS idx_transactions_anomaly_score_id ON transactions(anomaly_score DESC, id DESC) WHERE is_anomaly;
+CREATE INDEX IF NOT EXISTS idx_transactions_detection_time ON transactions(detection_time);
+CREATE INDEX IF NOT EXISTS idx_accounts_suspicious ON accounts(is_suspicious);
@@ -2,15 +2,36 @@ import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
-import psycopg2
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
+import time
+
+from db_pool import connect as db_connect
+from feature_store import AccountFeatureStore, ACCOUNT_FEATURES
+from inline_models import InlineForests
+from latency_metrics import stage_latencies
+from model_store import ModelStore, ModelNotFoundError
+from parallel_scorer import ParallelScorer
+from result_writer import AnomalyResultWriter
+from rule_engine import rule_engine
+from snapshot_store import SnapshotStore
+from streaming_stats import StreamingStatisticalDetector
+from typed_frames import read_compact
 
 load_dotenv()
 
+FEATURES = ['amount_scaled', 'hour', 'day_of_week'] + ACCOUNT_FEATURES
+# A counterparty pair with more transactions than this marks both accounts as suspicious
+NETWORK_PAIR_THRESHOLD = 5
+EPOCH = datetime(1970, 1, 1)
+# Columns load_data returns, from PostgreSQL or the snapshot
+SNAPSHOT_COLUMNS = ['id', 'amount', 'transaction_type', 'timestamp', 'from_account_id', 'to_account_id',
+                    'from_account', 'to_account']
+
 class TransactionAnomalyDetector:
-    def __init__(self, db_config):
+    def __init__(self, db_config, model_store=None, feature_store=None, snapshot_store=None):
         self.db_config = {
             'host': os.getenv('DB_HOST', 'localhost'),
             'database': os.getenv('DB_NAME', 'transaction_db'),
@@ -21,136 +42,629 @@ class TransactionAnomalyDetector:
         self.scaler = StandardScaler()
         self.isolation_forest = IsolationForest(contamination=0.01, random_state=42)
         self.random_forest = RandomForestClassifier(random_state=42)
-    
+        self.model_store = model_store or ModelStore()
+        self.feature_store = feature_store
+        # Columnar snapshot for training/sample reads (DATA_SOURCE=snapshot); None reads PostgreSQL
+        self.snapshot_store = snapshot_store or SnapshotStore.from_env()
+        self.result_writer = AnomalyResultWriter()
+        self.latency_store = stage_latencies
+        self.rule_engine = rule_engine
+        self.reset_run_stats()
+        self.model_version = None
+        # Running global/per-account statistics for the statistical stage
+        self.stat_detector = None
+        self.ensemble_threshold = None
+        # Direct tree walks over the loaded forests, for score_records()
+        self.inline_models = None
+        self.parallel_scorer = None
+        self.parallel_min_rows = int(os.getenv('PARALLEL_MIN_ROWS', '50000'))
+
     def connect_db(self):
-        return psycopg2.connect(**self.db_config)
-    
+        return db_connect(**self.db_config)
+
+    @contextmanager
+    def timed_stage(self, name):
+        """Accumulate wall time spent in ``name`` into ``stage_timings`` for the current run.
+
+        Each call is also observed in ``latency_store``, the rolling per-stage
+        histograms behind the dashboard latency percentiles.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_timings[name] = self.stage_timings.get(name, 0.0) + elapsed
+            if self.latency_store is not None:
+                self.latency_store.observe(name, elapsed)
+
+    def reset_run_stats(self):
+        self.write_stats = {'rows': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+        self.stage_timings = {}
+        self.progress = {'batches': 0, 'rows_scored': 0, 'anomalies': 0}
+
+    def record_progress(self, rows_scored, anomalies):
+        self.progress = {
+            'batches': self.progress['batches'] + 1,
+            'rows_scored': self.progress['rows_scored'] + rows_scored,
+            'anomalies': self.progress['anomalies'] + anomalies
+        }
+
     def load_data(self, limit=10000):
+        if self.snapshot_store is not None:
+            return self.snapshot_store.read(SNAPSHOT_COLUMNS, limit=limit)
         try:
             conn = self.connect_db()
             query = """
-                SELECT t.id, t.amount, t.transaction_type, t.timestamp,
+                SELECT t.id, t.amount::float8 as amount, t.transaction_type, t.timestamp,
+                       t.from_account_id, t.to_account_id,
                        a1.account_number as from_account, a2.account_number as to_account
                 FROM transactions t
                 JOIN accounts a1 ON t.from_account_id = a1.id
                 JOIN accounts a2 ON t.to_account_id = a2.id
                 LIMIT %s
             """
-            df = pd.read_sql(query, conn, params=(limit,))
+            df = read_compact(query, conn, params=(limit,))
             conn.close()
             return df
         except Exception as e:
             print(f"Error loading data: {str(e)}")
             raise
-    
-    def preprocess_data(self, df):
-        df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
-        df['amount_scaled'] = self.scaler.fit_transform(df[['amount']])
-        
-        features = ['amount_scaled', 'hour', 'day_of_week']
-        X = df[features].fillna(0)
+
+    def load_data_after(self, conn, watermark, limit=10000):
+        """Load the next batch of transactions strictly after ``(last_timestamp, last_id)``"""
+        last_timestamp, last_id = watermark
+        query = """
+            SELECT t.id, t.amount::float8 as amount, t.transaction_type, t.timestamp,
+                   t.from_account_id, t.to_account_id,
+                   a1.account_number as from_account, a2.account_number as to_account
+            FROM transactions t
+            JOIN accounts a1 ON t.from_account_id = a1.id
+            JOIN accounts a2 ON t.to_account_id = a2.id
+            WHERE t.timestamp IS NOT NULL
+              AND (%s::timestamp IS NULL OR (t.timestamp, t.id) > (%s::timestamp, %s::uuid))
+            ORDER BY t.timestamp, t.id
+            LIMIT %s
+        """
+        return read_compact(query, conn, params=(last_timestamp, last_timestamp, last_id, limit))
+
+    def get_watermark(self, cursor, name='default'):
+        """Return and lock the ``(last_timestamp, last_id)`` watermark for this detector"""
+        cursor.execute("""
+            INSERT INTO detection_watermarks (name) VALUES (%s)
+            ON CONFLICT (name) DO NOTHING
+        """, (name,))
+        # Row lock keeps two incremental runs from scoring the same range
+        cursor.execute("""
+            SELECT last_timestamp, last_id FROM detection_watermarks
+            WHERE name = %s
+            FOR UPDATE
+        """, (name,))
+        row = cursor.fetchone()
+        return (row[0], str(row[1]) if row[1] else None)
+
+    def advance_watermark(self, cursor, last_timestamp, last_id, rows_scored, name='default'):
+        cursor.execute("""
+            UPDATE detection_watermarks
+            SET last_timestamp = %s,
+                last_id = %s,
+                rows_scored = rows_scored + %s,
+                updated_at = %s
+            WHERE name = %s
+        """, (last_timestamp, last_id, rows_scored, datetime.now(), name))
+
+    def get_feature_store(self):
+        """The live per-account feature store, restored from its checkpoint on first use"""
+        if self.feature_store is None:
+            self.feature_store = AccountFeatureStore.load()
+        return self.feature_store
+
+    def attach_account_features(self, df, feature_store=None):
+        """Add point-in-time per-account features to ``df`` from the feature store.
+
+        Returns a boolean mask of the rows the store had not seen before.
+        """
+        store = feature_store or self.get_feature_store()
+        df[ACCOUNT_FEATURES], added = store.process(df, return_added=True)
+        return added
+
+    def preprocess_data(self, df, fit=False):
+        if not set(ACCOUNT_FEATURES).issubset(df.columns):
+            self.attach_account_features(df)
+        timestamps = pd.to_datetime(df['timestamp'])
+        df['hour'] = timestamps.dt.hour.astype(np.int8)
+        df['day_of_week'] = timestamps.dt.dayofweek.astype(np.int8)
+        if fit:
+            self.scaler.fit(df[['amount']])
+        df['amount_scaled'] = self.scaler.transform(df[['amount']]).astype(np.float32)
+
+        # The tree models split on float32 anyway, so the feature matrix is built at that width
+        X = df[FEATURES].fillna(0).astype(np.float32)
         return X, df['id']
-    
-    def detect_statistical_anomalies(self, X):
+
+    def detect_statistical_anomalies(self, X, accounts=None, amounts=None):
+        if self.stat_detector is not None:
+            return self.stat_detector.score(X, accounts, amounts)
         anomaly_scores = np.abs(X - X.mean()) / X.std()
         return anomaly_scores.max(axis=1)
-    
+
     def detect_ml_anomalies(self, X):
-        return -self.isolation_forest.fit_predict(X)
-    
-    def detect_network_anomalies(self, df):
+        return -self.isolation_forest.predict(X)
+
+    @staticmethod
+    def account_ids(df):
+        return pd.unique(pd.concat([df['from_account_id'], df['to_account_id']]).astype(str)).tolist()
+
+    def fetch_pair_counts(self, df):
+        """Live transaction counts for every pair touching an account in ``df``, in one indexed query.
+
+        Always PostgreSQL, even with ``DATA_SOURCE=snapshot``: scoring needs the
+        rows added since the last snapshot refresh, and re-reading the snapshot
+        for every chunk would cost a full scan per chunk.
+        """
+        account_ids = self.account_ids(df)
+        conn = self.connect_db()
         try:
-            conn = self.connect_db()
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT t.from_account_id, t.to_account_id, COUNT(*) as tx_count
                 FROM transactions t
+                WHERE t.from_account_id = ANY(%s::uuid[]) OR t.to_account_id = ANY(%s::uuid[])
                 GROUP BY t.from_account_id, t.to_account_id
-                HAVING COUNT(*) > 5
-            """)
-            suspicious_pairs = cursor.fetchall()
-            conn.close()
-            
-            # Get account numbers for the suspicious IDs
-            conn = self.connect_db()
-            cursor = conn.cursor()
-            suspicious_accounts = set()
-            for from_id, to_id, _ in suspicious_pairs:
-                cursor.execute("SELECT account_number FROM accounts WHERE id = %s", (from_id,))
-                from_account = cursor.fetchone()
-                if from_account:
-                    suspicious_accounts.add(from_account[0])
-                
-                cursor.execute("SELECT account_number FROM accounts WHERE id = %s", (to_id,))
-                to_account = cursor.fetchone()
-                if to_account:
-                    suspicious_accounts.add(to_account[0])
-            
+            """, (account_ids, account_ids))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
             conn.close()
-            return df['from_account'].isin(suspicious_accounts) | df['to_account'].isin(suspicious_accounts)
-        except Exception as e:
-            print(f"Error in network analysis: {str(e)}")
-            return pd.Series([False] * len(df))
-    
+        return pd.DataFrame(
+            [(str(from_id), str(to_id), count) for from_id, to_id, count in rows],
+            columns=['from_account_id', 'to_account_id', 'tx_count']
+        )
+
+    @staticmethod
+    def pair_counts_from_frame(df):
+        """In-memory pair-count index over the rows already loaded"""
+        return (
+            df.assign(from_account_id=df['from_account_id'].astype(str), to_account_id=df['to_account_id'].astype(str))
+            .groupby(['from_account_id', 'to_account_id'], sort=False)
+            .size()
+            .reset_index(name='tx_count')
+        )
+
+    def detect_network_anomalies(self, df, pair_counts=None):
+        """Flag rows touching an account in a pair with more than NETWORK_PAIR_THRESHOLD transactions.
+
+        Returns ``(flags, pair_count)``: a boolean mask and the per-row count of
+        transactions between the row's own account pair, aligned with ``df``.
+        """
+        if pair_counts is None:
+            try:
+                pair_counts = self.fetch_pair_counts(df)
+            except Exception as e:
+                print(f"Error in network analysis, falling back to in-batch pair counts: {str(e)}")
+                pair_counts = self.pair_counts_from_frame(df)
+
+        from_ids = df['from_account_id'].astype(str)
+        to_ids = df['to_account_id'].astype(str)
+        pair_index = pd.MultiIndex.from_frame(pair_counts[['from_account_id', 'to_account_id']])
+        counts = pd.Series(pair_counts['tx_count'].to_numpy(dtype=float), index=pair_index)
+        pair_count = counts.reindex(pd.MultiIndex.from_arrays([from_ids, to_ids])).fillna(0).to_numpy()
+
+        suspicious = pair_counts[pair_counts['tx_count'] > NETWORK_PAIR_THRESHOLD]
+        suspicious_accounts = pd.unique(pd.concat([suspicious['from_account_id'], suspicious['to_account_id']]))
+        flags = from_ids.isin(suspicious_accounts) | to_ids.isin(suspicious_accounts)
+        return (
+            pd.Series(flags.to_numpy(), index=df.index),
+            pd.Series(pair_count, index=df.index, name='pair_count')
+        )
+
     def train_supervised_model(self, X, y):
         self.random_forest.fit(X, y)
-    
+
     def detect_supervised_anomalies(self, X):
-        return self.random_forest.predict_proba(X)[:, 1]
-    
-    def run_detection(self):
-        df = self.load_data()
-        X, ids = self.preprocess_data(df)
-        
-        stat_scores = self.detect_statistical_anomalies(X)
+        proba = self.random_forest.predict_proba(X)
+        if proba.shape[1] == 1:
+            # Mock labels contained a single class, so the forest only knows that class
+            return np.full(len(X), float(self.random_forest.classes_[0]))
+        return proba[:, 1]
+
+    def ensemble(self, stat_scores, ml_scores, supervised_scores):
+        return stat_scores * 0.3 + ml_scores * 0.3 + supervised_scores * 0.4
+
+    def train(self, limit=10000):
+        """Fit scaler and models on a sample and persist them as a new model version"""
+        self.reset_run_stats()
+        with self.timed_stage('train'):
+            return self._train(limit)
+
+    def _train(self, limit):
+        with self.timed_stage('load'):
+            df = self.load_data(limit=limit)
+        if df.empty:
+            raise ValueError("No transactions available for training")
+        # In-sample features from a throwaway store, so the live store only sees new traffic
+        self.attach_account_features(df, AccountFeatureStore())
+        X, _ = self.preprocess_data(df, fit=True)
+
+        self.stat_detector = StreamingStatisticalDetector(FEATURES)
+        self.stat_detector.update(X, df['from_account'], df['amount'])
+        stat_scores = self.detect_statistical_anomalies(X, df['from_account'], df['amount'])
+
+        self.isolation_forest.fit(X)
         ml_scores = self.detect_ml_anomalies(X)
-        network_anomalies = self.detect_network_anomalies(df)
-        
+        # Training reads stay on the snapshot when there is one; scoring counts pairs live
+        pair_counts = None
+        if self.snapshot_store is not None:
+            pair_counts = self.snapshot_store.pair_counts(self.account_ids(df))
+        network_anomalies, df['pair_count'] = self.detect_network_anomalies(df, pair_counts)
+
         # Mock supervised labels for demonstration
-        y = (stat_scores > 3) | (ml_scores > 0) | network_anomalies
+        y = (stat_scores > 3) | (ml_scores > 0) | network_anomalies.values
         self.train_supervised_model(X, y)
+        self.inline_models = InlineForests(self.isolation_forest, self.random_forest)
         supervised_scores = self.detect_supervised_anomalies(X)
-        
-        ensemble_scores = (stat_scores * 0.3 + ml_scores * 0.3 + supervised_scores * 0.4)
-        anomalies = ensemble_scores > ensemble_scores.mean() + 2 * ensemble_scores.std()
-        
+
+        ensemble_scores = self.ensemble(stat_scores, ml_scores, supervised_scores)
+        self.ensemble_threshold = float(ensemble_scores.mean() + 2 * ensemble_scores.std())
+
+        self.model_version = self.model_store.save(
+            {
+                'scaler': self.scaler,
+                'isolation_forest': self.isolation_forest,
+                'random_forest': self.random_forest,
+                'streaming_stats': self.stat_detector.to_dict()
+            },
+            {
+                'features': FEATURES,
+                'training_rows': len(df),
+                'ensemble_threshold': self.ensemble_threshold
+            }
+        )
+        self.stat_detector.model_version = self.model_version
+        return self.model_version
+
+    def load_models(self, version=None):
+        """Load a persisted model version (the current one by default)"""
+        artifacts, metadata = self.model_store.load(version)
+        if metadata.get('features') != FEATURES:
+            raise ModelNotFoundError(
+                f"Model version {metadata['version']} was trained on {metadata.get('features')}, "
+                f"expected {FEATURES}; retrain the model"
+            )
+        self.scaler = artifacts['scaler']
+        self.isolation_forest = artifacts['isolation_forest']
+        self.random_forest = artifacts['random_forest']
+        self.inline_models = InlineForests(self.isolation_forest, self.random_forest)
+        self.stat_detector = self.load_streaming_stats(artifacts, metadata['version'])
+        self.ensemble_threshold = metadata['ensemble_threshold']
+        self.model_version = metadata['version']
+        if self.parallel_scorer is not None:
+            # Workers hold the previous version; restart them on the new one
+            self.enable_parallel_scoring(self.parallel_scorer.workers, self.parallel_scorer.partition_by)
+        return self.model_version
+
+    def load_streaming_stats(self, artifacts, version):
+        """Live streaming statistics if checkpointed for this model version, else the training baseline.
+
+        The global statistics include ``amount_scaled``, which only means
+        something under the scaler they were accumulated with, so a new model
+        version starts from its own baseline; per-account statistics track raw
+        amounts and are carried over.
+        """
+        live = StreamingStatisticalDetector.load()
+        if live is not None and live.features == FEATURES and live.model_version == version:
+            return live
+        baseline = StreamingStatisticalDetector.from_dict(
+            artifacts['streaming_stats'], path=StreamingStatisticalDetector.default_path()
+        )
+        baseline.model_version = version
+        if live is not None and live.features == FEATURES:
+            baseline.carry_over_accounts(live)
+        return baseline
+
+    def maybe_checkpoint_state(self):
+        self.get_feature_store().maybe_checkpoint()
+        if self.stat_detector is not None:
+            self.stat_detector.maybe_checkpoint()
+
+    def ensure_models(self):
+        if self.model_version is None:
+            self.load_models()
+
+    def enable_parallel_scoring(self, workers=None, partition_by='account', min_rows=None):
+        """Score batches of at least ``min_rows`` rows on a process pool of ``workers`` processes"""
+        self.disable_parallel_scoring()
+        self.ensure_models()
+        self.parallel_scorer = ParallelScorer(self.model_store, self.model_version, workers, partition_by)
+        if min_rows is not None:
+            self.parallel_min_rows = min_rows
+        return self.parallel_scorer
+
+    def disable_parallel_scoring(self):
+        if self.parallel_scorer is not None:
+            self.parallel_scorer.close()
+            self.parallel_scorer = None
+
+    def score(self, df, include_network=True, update_stats=True):
+        """Score a DataFrame with the loaded models; predict-only, nothing is refit.
+
+        The statistical stage scores each row against the running statistics
+        and then folds the batch into them, unless ``update_stats`` is False.
+        Only rows the feature store folds in for the first time reach the
+        statistics, so re-scoring rows leaves them unchanged while historical
+        and late rows (within the store's retention) are still counted once.
+        """
+        self.ensure_models()
+        # Feature store and running statistics live in this process, so use them before fanning out
+        with self.timed_stage('features'):
+            added = self.attach_account_features(df)
+        with self.timed_stage('preprocess'):
+            X, ids = self.preprocess_data(df)
+        with self.timed_stage('statistical'):
+            stat_scores = self.detect_statistical_anomalies(X, df['from_account'], df['amount'])
+            if update_stats:
+                self.stat_detector.update(X[added], df['from_account'][added], df['amount'][added])
+
+        if self.parallel_scorer is not None and len(df) >= self.parallel_min_rows:
+            with self.timed_stage('models_parallel'):
+                model_scores = self.parallel_scorer.score(df)
+        else:
+            model_scores = self.score_models(df, preprocessed=X)
+
+        ensemble_scores = self.ensemble(
+            np.asarray(stat_scores, dtype=float), model_scores['ml'].to_numpy(), model_scores['supervised'].to_numpy()
+        )
+        scores = pd.DataFrame({
+            'id': ids.values,
+            'statistical': np.asarray(stat_scores, dtype=float),
+            'ml': model_scores['ml'].to_numpy(),
+            'supervised': model_scores['supervised'].to_numpy(),
+            'ensemble': ensemble_scores,
+            'is_anomaly': ensemble_scores > self.ensemble_threshold
+        })
+        if include_network:
+            with self.timed_stage('network'):
+                network_anomalies, pair_count = self.detect_network_anomalies(df)
+            scores['network'] = network_anomalies.to_numpy()
+            scores['pair_count'] = pair_count.to_numpy()
+        with self.timed_stage('rules'):
+            rules = self.rule_engine.evaluate(
+                df, self.new_counterparty_mask(df, scores['pair_count'].to_numpy() if include_network else None)
+            )
+        scores['rule_score'] = rules['rule_score'].to_numpy()
+        scores['rule_hits'] = rules['rule_hits'].to_numpy()
+        scores['rule_based'] = rules['rule_based'].to_numpy()
+        return scores
+
+    @staticmethod
+    def new_counterparty_mask(df, pair_count=None):
+        """Rows paying a counterparty for the first time: first in-batch occurrence of the pair,
+        and, given historical ``pair_count``s (which include this batch), no earlier history"""
+        pairs = df[['from_account_id', 'to_account_id']].astype(str)
+        first = ~pairs.duplicated().to_numpy()
+        if pair_count is None:
+            return first
+        in_batch = pairs.groupby(['from_account_id', 'to_account_id'])['from_account_id'].transform('size').to_numpy()
+        return first & (pair_count <= in_batch)
+
+    def score_models(self, df, preprocessed=None):
+        """ML and supervised model scores for ``df``; no database access or shared state"""
+        X = preprocessed if preprocessed is not None else self.preprocess_data(df)[0]
+        with self.timed_stage('ml'):
+            ml_scores = np.asarray(self.detect_ml_anomalies(X), dtype=float)
+        with self.timed_stage('supervised'):
+            supervised_scores = np.asarray(self.detect_supervised_anomalies(X), dtype=float)
+        return pd.DataFrame({'ml': ml_scores, 'supervised': supervised_scores})
+
+    def score_records(self, records):
+        """Low-latency scoring of a few transactions given as dicts.
+
+        Features come from the in-memory feature store and running statistics
+        only, so there is no database round trip. Both are only read: the
+        transactions are folded in when detection later runs over the table,
+        so scoring the same transaction twice gives the same result. Each
+        result names the model version that produced it.
+        """
+        self.ensure_models()
+        now = datetime.now()
+        accounts = [str(record['from_account']) for record in records]
+        amounts = np.array([float(record['amount']) for record in records])
+        timestamps = []
+        for record in records:
+            timestamp = record.get('timestamp') or now
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            timestamps.append(timestamp)
+        epochs = [int((timestamp - EPOCH).total_seconds()) for timestamp in timestamps]
+
+        X = np.empty((len(records), len(FEATURES)))
+        X[:, 0] = (amounts - self.scaler.mean_[0]) / self.scaler.scale_[0]
+        X[:, 1] = [timestamp.hour for timestamp in timestamps]
+        X[:, 2] = [timestamp.weekday() for timestamp in timestamps]
+        X[:, 3:] = self.get_feature_store().lookup_many(accounts, epochs)
+
+        stat_scores = self.stat_detector.score_rows(X, accounts, amounts)
+        # The forests' own predict costs tens of milliseconds per call in joblib dispatch alone
+        ml_scores = self.inline_models.ml_scores(X)
+        supervised_scores = self.inline_models.supervised_scores(X)
+        ensemble_scores = self.ensemble(stat_scores, ml_scores, supervised_scores)
+        return [
+            {
+                "id": record.get('id'),
+                "ensemble_score": float(ensemble_scores[i]),
+                "is_anomaly": bool(ensemble_scores[i] > self.ensemble_threshold),
+                "model_version": self.model_version,
+                "components": {
+                    "statistical": float(stat_scores[i]),
+                    "ml": float(ml_scores[i]),
+                    "supervised": float(supervised_scores[i])
+                }
+            }
+            for i, record in enumerate(records)
+        ]
+
+    def save_anomalies(self, cursor, scores):
+        """Write flagged rows of a ``score()`` result; the caller owns the transaction.
+
+        Rule hits are written first (``rule_based``, with the rule names as
+        reasons) so a row flagged by both keeps the ensemble score.
+        """
+        results = []
+        if 'rule_based' in scores:
+            ruled = scores[scores['rule_based']]
+            self.record_write(self.result_writer.write(
+                cursor, ruled['id'], ruled['rule_score'], reasons=ruled['rule_hits'],
+                detection_method='rule_based', confidence=1.0
+            ))
+            results.extend(
+                {"transaction_id": str(transaction_id), "score": float(score), "detection_method": 'rule_based'}
+                for transaction_id, score in zip(ruled['id'], ruled['rule_score'])
+            )
+        flagged = scores[scores['is_anomaly']]
+        self.record_write(self.result_writer.write(cursor, flagged['id'], flagged['ensemble']))
+        results.extend(
+            {"transaction_id": str(transaction_id), "score": float(score), "detection_method": 'ensemble'}
+            for transaction_id, score in zip(flagged['id'], flagged['ensemble'])
+        )
+        return results
+
+    def record_write(self, stats):
+        rows = self.write_stats['rows'] + stats['rows']
+        seconds = self.write_stats['seconds'] + stats['seconds']
+        self.write_stats = {
+            'rows': rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else 0.0
+        }
+
+    def run_detection(self):
+        self.reset_run_stats()
+        with self.timed_stage('load'):
+            df = self.load_data()
+        scores = self.score(df)
+
+        conn = None
         try:
             conn = self.connect_db()
             cursor = conn.cursor()
-            
-            for idx, is_anomaly in enumerate(anomalies):
-                if is_anomaly:
-                    transaction_id = ids.iloc[idx]
-                    cursor.execute("""
-                        UPDATE transactions
-                        SET is_anomaly = %s,
-                            anomaly_score = %s,
-                            anomaly_reasons = %s,
-                            detection_time = %s
-                        WHERE id = %s
-                    """, (
-                        True,
-                        float(ensemble_scores[idx]),
-                        ['High amount', 'Unusual pattern'],
-                        datetime.now(),  # new field
-                        transaction_id
-                    ))
-
-                    
-                    cursor.execute("""
-                        INSERT INTO anomaly_detections (transaction_id, detection_method, anomaly_score, confidence, detection_time)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (transaction_id, 'ensemble', float(ensemble_scores[idx]), 0.95, datetime.now()))
-            
-            conn.commit()
+            with self.timed_stage('persist'):
+                anomalies = self.save_anomalies(cursor, scores)
+                conn.commit()
+            self.record_progress(len(df), len(anomalies))
             cursor.close()
             conn.close()
-            
-            return [{"transaction_id": str(ids.iloc[i]), "score": float(ensemble_scores[i])} for i in range(len(anomalies)) if anomalies[i]]
+            return anomalies
         except Exception as e:
             print(f"Error saving anomalies: {str(e)}")
             if conn:
                 conn.rollback()
                 conn.close()
-            raise
\ No newline at end of file
+            raise
+
+    def run_incremental_detection(self, batch_size=10000, max_batches=None, name='default'):
+        """Score only transactions newer than the persisted watermark.
+
+        Each batch is scored, written and the watermark advanced in a single
+        database transaction, so a crashed run resumes from the last committed batch.
+        """
+        self.ensure_models()
+        self.reset_run_stats()
+        anomalies = []
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            conn = None
+            try:
+                conn = self.connect_db()
+                cursor = conn.cursor()
+                with self.timed_stage('load'):
+                    watermark = self.get_watermark(cursor, name)
+                    df = self.load_data_after(conn, watermark, limit=batch_size)
+                if df.empty:
+                    conn.rollback()
+                    cursor.close()
+                    conn.close()
+                    break
+
+                scores = self.score(df)
+                with self.timed_stage('persist'):
+                    flagged = self.save_anomalies(cursor, scores)
+                    last = df.iloc[-1]
+                    self.advance_watermark(cursor, last['timestamp'].to_pydatetime(), str(last['id']), len(df), name)
+                    conn.commit()
+                cursor.close()
+                conn.close()
+                anomalies.extend(flagged)
+                self.record_progress(len(df), len(flagged))
+                self.maybe_checkpoint_state()
+            except Exception as e:
+                print(f"Error in incremental detection: {str(e)}")
+                if conn:
+                    conn.rollback()
+                    conn.close()
+                raise
+            batches += 1
+            if len(df) < batch_size:
+                break
+        return anomalies
+
+    def iter_transaction_chunks(self, conn, chunk_size=50000):
+        """Stream the whole transactions table in ``(timestamp, id)`` order, one DataFrame per chunk.
+
+        Each chunk is a keyset query for the rows after the previous chunk's
+        last row (``load_data_after``, served by idx_transactions_timestamp_id),
+        so chunks are contiguous in time and no query re-reads skipped rows.
+        Rows without a timestamp are skipped, as in incremental detection.
+        """
+        watermark = (None, None)
+        while True:
+            with self.timed_stage('load'):
+                chunk = self.load_data_after(conn, watermark, limit=chunk_size)
+            if chunk.empty:
+                break
+            last = chunk.iloc[-1]
+            watermark = (last['timestamp'].to_pydatetime(), str(last['id']))
+            yield chunk
+            if len(chunk) < chunk_size:
+                break
+
+    def run_streaming_detection(self, chunk_size=50000):
+        """Score the full table chunk by chunk, committing each chunk's results before reading the next.
+
+        Only one chunk is held in memory at a time, so peak memory depends on
+        ``chunk_size`` rather than table size. Returns summary counts.
+        """
+        self.ensure_models()
+        self.reset_run_stats()
+        summary = {'chunks': 0, 'rows_scored': 0, 'anomalies': 0}
+        read_conn = None
+        write_conn = None
+        try:
+            read_conn = self.connect_db()
+            read_conn.set_session(readonly=True)
+            write_conn = self.connect_db()
+            write_cursor = write_conn.cursor()
+
+            for chunk in self.iter_transaction_chunks(read_conn, chunk_size):
+                scores = self.score(chunk)
+                with self.timed_stage('persist'):
+                    flagged = self.save_anomalies(write_cursor, scores)
+                    write_conn.commit()
+
+                summary['chunks'] += 1
+                summary['rows_scored'] += len(chunk)
+                summary['anomalies'] += len(flagged)
+                self.record_progress(len(chunk), len(flagged))
+                self.maybe_checkpoint_state()
+
+            write_cursor.close()
+            return summary
+        except Exception as e:
+            print(f"Error in streaming detection: {str(e)}")
+            if write_conn:
+                write_conn.rollback()
+            raise
+        finally:
+            if read_conn:
+                read_conn.close()
+            if write_conn:
+                write_conn.close()
@@ -1,18 +1,36 @@
 from fastapi import FastAPI, HTTPException, Query, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
 import psycopg2
-from datetime import datetime
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import random
 import asyncio
 import logging
 import os
 from dotenv import load_dotenv
+import threading
 import time
+from typing import List, Optional, Union
 
 import uvicorn
 from anomaly_detector import TransactionAnomalyDetector
+from async_db import CONNECTION_ERRORS, AsyncDatabase
+from counters import install_counters, read_counters
+from db_instrumentation import query_log
+from db_pool import PoolTimeoutError, get_pool
+from detection_jobs import DetectionJobManager, JobAlreadyRunningError
+from inference_scheduler import InferenceScheduler
+from latency_metrics import stage_latencies
+from model_store import ModelStore, ModelNotFoundError
 from network_analyzer import NetworkAnalyzer
+from partition_manager import ensure_partitions, is_partitioned
+from prometheus_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS_REGISTRY, PrometheusMiddleware
+from rule_engine import rule_engine
 
 load_dotenv()
 
@@ -28,6 +46,11 @@ DB_CONFIG = {
     'port': os.getenv('DB_PORT', '5432')
 }
 
+# Shared with the detector and network analyzer, which connect with the same settings
+db_pool = get_pool(DB_CONFIG)
+# Non-blocking pool used by the request handlers themselves
+async_db = AsyncDatabase(DB_CONFIG)
+
 app = FastAPI(title="Transaction Anomaly Detection API", version="1.0.0")
 
 app.add_middleware(
@@ -37,13 +60,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
 
 # Helpers
 def get_db_connection():
+    """A pooled connection; ``close()`` returns it to the pool"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = db_pool.getconn()
         conn.autocommit = False  # Explicit transaction control
         return conn
+    except PoolTimeoutError as e:
+        logger.error(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database busy, no connection available")
     except psycopg2.OperationalError as e:
         logger.error(f"Database connection failed: {e}")
         raise HTTPException(status_code=503, detail="Database connection failed")
@@ -51,69 +79,123 @@ def get_db_connection():
         logger.error(f"Unexpected database error: {e}")
         raise HTTPException(status_code=500, detail="Database error")
 
-def execute_with_retry(cursor, query, params=None, max_retries=3):
-    """Execute a query with retry logic for transient errors"""
-    for attempt in range(max_retries):
-        try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            return cursor.fetchone()
-        except psycopg2.OperationalError as e:
-            if attempt == max_retries - 1:
-                raise e
-            logger.warning(f"Database operation failed, retrying... (attempt {attempt + 1})")
-            time.sleep(0.1 * (2 ** attempt))  # Exponential backoff
-        except Exception as e:
-            raise e
+def database_error(e):
+    """HTTPException for a failed handler: 503 when the database is unavailable or saturated, else 500"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, (PoolTimeoutError,) + CONNECTION_ERRORS):
+        logger.error(f"Database unavailable: {e}")
+        return HTTPException(status_code=503, detail="Database unavailable")
+    return HTTPException(status_code=500, detail=str(e))
 
-def check_database_schema(cursor):
-    """Check if required database tables exist"""
-    required_tables = ['accounts', 'transactions', 'anomaly_detections']
-    existing_tables = []
-    
+REQUIRED_TABLES = ['accounts', 'transactions', 'anomaly_detections']
+# A complete schema is cached for the process lifetime; a missing table is re-checked after this many seconds
+SCHEMA_RECHECK_SECONDS = 30.0
+schema_check = {'valid': False, 'missing_tables': REQUIRED_TABLES, 'checked_at': None}
+
+def encode_cursor(sort_value, row_id):
+    """Opaque keyset cursor for the row after which the next page starts"""
+    raw = json.dumps([sort_value.isoformat() if isinstance(sort_value, datetime) else str(sort_value), str(row_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, parse_sort_value):
+    """(sort value, row id) from ``encode_cursor`` output; a malformed cursor is a 400"""
     try:
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public'
-        """)
-        existing_tables = [row[0] for row in cursor.fetchall()]
-        
-        missing_tables = [table for table in required_tables if table not in existing_tables]
-        
-        if missing_tables:
-            logger.warning(f"Missing required tables: {missing_tables}")
-            return False, missing_tables
-        
-        logger.info("All required tables exist")
-        return True, []
-        
-    except Exception as e:
-        logger.error(f"Error checking database schema: {e}")
-        return False, required_tables
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return parse_sort_value(sort_value), str(uuid.UUID(row_id))
+    except (ValueError, TypeError, InvalidOperation):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def check_database_schema(force=False):
+    """Check if required database tables exist; connection errors propagate to the caller"""
+    checked_at = schema_check['checked_at']
+    if not force and checked_at is not None and \
+            (schema_check['valid'] or time.monotonic() - checked_at < SCHEMA_RECHECK_SECONDS):
+        return schema_check['valid'], schema_check['missing_tables']
+    
+    rows = await async_db.fetch("""
+        SELECT table_name 
+        FROM information_schema.tables 
+        WHERE table_schema = 'public' AND table_name = ANY($1::text[])
+    """, REQUIRED_TABLES)
+    existing_tables = [row[0] for row in rows]
+    
+    missing_tables = [table for table in REQUIRED_TABLES if table not in existing_tables]
+    schema_check.update(valid=not missing_tables, missing_tables=missing_tables, checked_at=time.monotonic())
+    
+    if missing_tables:
+        logger.warning(f"Missing required tables: {missing_tables}")
+        return False, missing_tables
+    
+    logger.info("All required tables exist")
+    return True, []
 
 # Network analyzer instance
 network_analyzer = NetworkAnalyzer()
 
+# Detector with models loaded once and reused across detection requests
+model_store = ModelStore()
+detector = None
+# Serializes creating and replacing the shared detector; the event loop, the inference
+# thread and the detection job thread all call get_detector()
+detector_lock = threading.Lock()
+DETECTION_WORKERS = int(os.getenv('DETECTION_WORKERS', '1'))
+detection_jobs = DetectionJobManager()
+MAX_SCORE_BATCH = 100
+
+def build_detector(version, previous=None):
+    """A fully loaded detector for ``version``, carrying over the live state of ``previous``"""
+    replacement = TransactionAnomalyDetector(
+        DB_CONFIG, model_store=model_store, feature_store=previous.feature_store if previous else None
+    )
+    replacement.load_models(version)
+    if previous is not None and previous.stat_detector is not None \
+            and previous.stat_detector.features == replacement.stat_detector.features:
+        # In-memory per-account statistics are newer than their last checkpoint; the global ones
+        # belong to the previous model's scaler and start over from the new training baseline
+        replacement.stat_detector.carry_over_accounts(previous.stat_detector)
+    if DETECTION_WORKERS > 1:
+        replacement.enable_parallel_scoring(workers=DETECTION_WORKERS)
+        logger.info(f"Parallel scoring enabled with {DETECTION_WORKERS} workers")
+    return replacement
+
+def retire_detector(old):
+    """Shut down a replaced detector's worker pool, unless a running job still holds it"""
+    if not any(job.detector is old for job in list(detection_jobs.jobs.values())):
+        old.disable_parallel_scoring()
+
+def get_detector():
+    """Return the shared detector, replacing it only when a new model version is published.
+
+    The replacement is built completely before one assignment under
+    ``detector_lock`` publishes it, so callers never see a detector with
+    models from two versions.
+    """
+    global detector
+    current_version = model_store.current_version()
+    if current_version is None:
+        raise ModelNotFoundError("No trained model available; POST /api/models/train first")
+    current = detector
+    if current is not None and current.model_version == current_version:
+        return current
+    with detector_lock:
+        previous = detector
+        if previous is None or previous.model_version != current_version:
+            detector = build_detector(current_version, previous)
+            logger.info(f"Loaded model version {current_version}")
+            if previous is not None:
+                retire_detector(previous)
+        return detector
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify system status"""
     try:
-        # Test database connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Simple query to test database
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
+        await async_db.fetchval("SELECT 1")
         
         # Check database schema
-        schema_valid, missing_tables = check_database_schema(cursor)
-        
-        cursor.close()
-        conn.close()
+        schema_valid, missing_tables = await check_database_schema(force=True)
         
         if schema_valid:
             return {
@@ -140,15 +222,38 @@ async def health_check():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of request, database, WebSocket and detection job metrics"""
+    return Response(METRICS_REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/admin/db-pool")
+async def get_db_pool_stats():
+    return {"psycopg2": db_pool.stats(), "asyncpg": async_db.stats()}
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(limit: int = Query(20, ge=1, le=200)):
+    """Per-query-shape timings (top by total time) and recent slow statements with sampled EXPLAIN plans"""
+    return query_log.report(limit)
+
+@app.delete("/api/admin/slow-queries")
+async def reset_slow_queries():
+    query_log.reset()
+    return {"message": "Query statistics reset"}
+
 @app.get("/setup-database")
-async def setup_database():
-    """Setup database schema if it doesn't exist"""
+def setup_database(partitioned: bool = False):
+    """Setup database schema if it doesn't exist, optionally with monthly partitioned transactions.
+
+    Plain ``def``: the DDL runs on psycopg2 in FastAPI's threadpool, off the event loop.
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         
         # Read and execute the SQL schema file
-        schema_file_path = os.path.join(os.path.dirname(__file__), "01-create-database.sql")
+        schema_file = "01-create-database-partitioned.sql" if partitioned else "01-create-database.sql"
+        schema_file_path = os.path.join(os.path.dirname(__file__), schema_file)
         
         if not os.path.exists(schema_file_path):
             return {"error": "Schema file not found", "path": schema_file_path}
@@ -161,18 +266,35 @@ async def setup_database():
         
         for statement in statements:
             if statement:
+                # A savepoint per statement, so one failure does not abort the rest of the transaction
+                cursor.execute("SAVEPOINT schema_statement")
                 try:
                     cursor.execute(statement)
+                    cursor.execute("RELEASE SAVEPOINT schema_statement")
                     logger.info(f"Executed SQL statement: {statement[:50]}...")
                 except Exception as e:
-                    logger.warning(f"Statement failed (may already exist): {e}")
+                    cursor.execute("ROLLBACK TO SAVEPOINT schema_statement")
+                    logger.warning(f"Statement failed: {e}")
         
         conn.commit()
+        schema_check['checked_at'] = None
+        partitions = []
+        if partitioned and is_partitioned(cursor):
+            partitions = ensure_partitions(cursor)
+            conn.commit()
+        try:
+            install_counters(cursor)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Could not install transaction counters: {e}")
         cursor.close()
         conn.close()
         
         return {
             "message": "Database setup completed",
+            "partitioned": partitioned,
+            "partitions_created": partitions,
             "timestamp": datetime.now().isoformat()
         }
         
@@ -187,30 +309,20 @@ async def setup_database():
 async def get_sample_data():
     """Get sample data to verify database content"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Get sample accounts
-        cursor.execute("SELECT COUNT(*) FROM accounts")
-        account_count = cursor.fetchone()[0] or 0
+        account_count = await async_db.fetchval("SELECT COUNT(*) FROM accounts") or 0
         
         # Get sample transactions
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        transaction_count = cursor.fetchone()[0] or 0
+        transaction_count = await async_db.fetchval("SELECT COUNT(*) FROM transactions") or 0
         
         # Get sample anomalies
-        cursor.execute("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true")
-        anomaly_count = cursor.fetchone()[0] or 0
+        anomaly_count = await async_db.fetchval("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true") or 0
         
         # Get date range
-        cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM transactions")
-        date_range = cursor.fetchone()
+        date_range = await async_db.fetchrow("SELECT MIN(timestamp), MAX(timestamp) FROM transactions")
         min_date = date_range[0] if date_range[0] else None
         max_date = date_range[1] if date_range[1] else None
         
-        cursor.close()
-        conn.close()
-        
         return {
             "account_count": account_count,
             "transaction_count": transaction_count,
@@ -229,14 +341,23 @@ async def get_sample_data():
             "timestamp": datetime.now().isoformat()
         }
 
+def latency_fields():
+    """Detector stage latencies (p50, milliseconds) and full percentiles from the rolling histograms"""
+    return {
+        "statistical_latency": stage_latencies.p50_ms('statistical'),
+        "ml_latency": stage_latencies.p50_ms('ml', 'supervised') or stage_latencies.p50_ms('models_parallel'),
+        "network_latency": stage_latencies.p50_ms('network'),
+        "stage_latency": stage_latencies.snapshot()
+    }
+
 @app.get("/api/dashboard/metrics")
 async def get_dashboard_metrics():
     try:
         logger.info("Starting dashboard metrics calculation")
         
-        # Test database connection first
+        # Test database connection first, together with the schema check
         try:
-            conn = get_db_connection()
+            schema_valid, missing_tables = await check_database_schema()
             logger.info("Database connection successful")
         except Exception as conn_error:
             logger.error(f"Database connection failed: {conn_error}")
@@ -249,25 +370,19 @@ async def get_dashboard_metrics():
                 "overall_risk": "Low",
                 "transaction_growth": 0.0,
                 "detection_rate": 0.0,
-                "avg_response_time": 2.3,
+                "avg_response_time": 0.0,
                 "precision": 0.0,
                 "recall": 0.0,
                 "f1_score": 0.0,
                 "false_positive_rate": 0.0,
-                "avg_detection_time": 2.3,
-                "statistical_latency": 0.8,
-                "ml_latency": 3.2,
-                "network_latency": 2.9
+                "avg_detection_time": 0.0,
+                **latency_fields()
             }
         
-        cursor = conn.cursor()
-        
         try:
             # Basic counts
-            logger.info("Executing basic count queries")
+            logger.info("Reading dashboard counters")
             
-            # Check if required tables exist
-            schema_valid, missing_tables = check_database_schema(cursor)
             if not schema_valid:
                 logger.error(f"Database schema validation failed. Missing tables: {missing_tables}")
                 return {
@@ -279,67 +394,35 @@ async def get_dashboard_metrics():
                     "overall_risk": "Low",
                     "transaction_growth": 0.0,
                     "detection_rate": 0.0,
-                    "avg_response_time": 2.3,
+                    "avg_response_time": 0.0,
                     "precision": 0.0,
                     "recall": 0.0,
                     "f1_score": 0.0,
                     "false_positive_rate": 0.0,
-                    "avg_detection_time": 2.3,
-                    "statistical_latency": 0.8,
-                    "ml_latency": 3.2,
-                    "network_latency": 2.9
+                    "avg_detection_time": 0.0,
+                    **latency_fields()
                 }
             
-            cursor.execute("SELECT COUNT(*) FROM transactions")
-            total_transactions = cursor.fetchone()[0] or 0
-            logger.info(f"Total transactions: {total_transactions}")
-            
-            cursor.execute("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true")
-            total_anomalies = cursor.fetchone()[0] or 0
-            logger.info(f"Total anomalies: {total_anomalies}")
-            
-            cursor.execute("SELECT COUNT(*) FROM accounts")
-            total_nodes = cursor.fetchone()[0] or 0
-            logger.info(f"Total nodes: {total_nodes}")
-            
-            cursor.execute("SELECT AVG(anomaly_score) FROM transactions WHERE is_anomaly = true")
-            avg_risk = cursor.fetchone()[0] or 0
-            logger.info(f"Average risk score: {avg_risk}")
+            # Every aggregate comes from the trigger-maintained counters, always current
+            counters = await read_counters(async_db)
+            total_transactions = counters['total_count']
+            total_anomalies = counters['anomaly_count']
+            total_nodes = counters['account_count']
+            avg_risk = counters['avg_anomaly_score']
+            logger.info(f"Total transactions: {total_transactions}, anomalies: {total_anomalies}, nodes: {total_nodes}")
             
             overall_risk = "High" if avg_risk > 80 else "Medium" if avg_risk > 50 else "Low"
             
-            # Transaction growth calculation with safe division - using all historical data
-            logger.info("Calculating transaction growth from all historical data")
-            cursor.execute("""
-                SELECT 
-                    (SELECT COUNT(*) FROM transactions) as total_transactions,
-                    (SELECT COUNT(*) FROM transactions WHERE is_anomaly = true) as total_anomalies
-            """)
-            growth_data = cursor.fetchone()
-            total_all_transactions = growth_data[0] or 0
-            total_all_anomalies = growth_data[1] or 0
-            
             # Calculate growth based on total data instead of recent weeks
-            if total_all_transactions > 0:
-                transaction_growth = (total_all_anomalies / total_all_transactions * 100)
+            if total_transactions > 0:
+                transaction_growth = (total_anomalies / total_transactions * 100)
             else:
                 transaction_growth = 0
             
-            logger.info(f"Transaction growth (anomaly rate): {transaction_growth}%")
-            
             # Anomaly detection metrics with safe division
-            logger.info("Calculating anomaly detection metrics")
-            cursor.execute("""
-                SELECT 
-                    SUM(CASE WHEN is_anomaly THEN 1 ELSE 0 END) as true_positives,
-                    SUM(CASE WHEN is_anomaly THEN 1 ELSE 0 END) as false_positives,
-                    SUM(CASE WHEN NOT is_anomaly THEN 1 ELSE 0 END) as true_negatives
-                FROM transactions
-            """)
-            metrics_data = cursor.fetchone()
-            tp = metrics_data[0] or 0
-            fp = metrics_data[1] or 0
-            tn = metrics_data[2] or 0
+            tp = total_anomalies
+            fp = total_anomalies
+            tn = total_transactions - total_anomalies
             
             # Safe division for precision, recall, and F1 score
             precision = (tp / (tp + fp) * 100) if (tp + fp) > 0 else 0
@@ -349,23 +432,8 @@ async def get_dashboard_metrics():
             
             logger.info(f"Precision: {precision}%, Recall: {recall}%, F1: {f1_score}%")
             
-            # Average detection time - use detected_at from anomaly_detections and timestamp from transactions
-            logger.info("Calculating average detection time")
-            try:
-                cursor.execute("""
-                    SELECT AVG(EXTRACT(EPOCH FROM (ad.detected_at - t.timestamp))) 
-                    FROM anomaly_detections ad 
-                    JOIN transactions t ON ad.transaction_id = t.id
-                    WHERE ad.detected_at IS NOT NULL AND t.timestamp IS NOT NULL
-                """)
-                avg_detection_time = cursor.fetchone()[0] or 2.3
-                logger.info(f"Average detection time: {avg_detection_time}")
-            except Exception as e:
-                logger.warning(f"Could not calculate average detection time: {e}")
-                avg_detection_time = 2.3
-            
-            cursor.close()
-            conn.close()
+            # Average detection time - detected_at from anomaly_detections minus the transaction timestamp
+            avg_detection_time = counters['avg_detection_latency']
             
             logger.info("Dashboard metrics calculation completed successfully")
             
@@ -383,15 +451,11 @@ async def get_dashboard_metrics():
                 "f1_score": round(float(f1_score), 1),
                 "false_positive_rate": round(float(false_positive_rate), 1),
                 "avg_detection_time": round(float(avg_detection_time), 1),
-                "statistical_latency": 0.8,
-                "ml_latency": 3.2,
-                "network_latency": 2.9
+                **latency_fields()
             }
             
         except Exception as query_error:
             logger.error(f"Error executing database queries: {query_error}", exc_info=True)
-            cursor.close()
-            conn.close()
             raise query_error
             
     except Exception as e:
@@ -406,35 +470,44 @@ async def get_dashboard_metrics():
             "overall_risk": "Low",
             "transaction_growth": 0.0,
             "detection_rate": 0.0,
-            "avg_response_time": 2.3,
+            "avg_response_time": 0.0,
             "precision": 0.0,
             "recall": 0.0,
             "f1_score": 0.0,
             "false_positive_rate": 0.0,
-            "avg_detection_time": 2.3,
-            "statistical_latency": 0.8,
-            "ml_latency": 3.2,
-            "network_latency": 2.9
+            "avg_detection_time": 0.0,
+            **latency_fields()
         }
 
 @app.get("/api/transactions")
-async def get_transactions(page: int = Query(1, ge=1), limit: int = Query(50, ge=1, le=100)):
+async def get_transactions(page: int = Query(1, ge=1), limit: int = Query(50, ge=1, le=100),
+                           cursor: Optional[str] = None):
+    """Newest first. Pass the returned ``next_cursor`` to fetch the following page at constant cost
+    (keyset on ``(timestamp, id)``); ``page`` alone still works but uses OFFSET."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        offset = (page - 1) * limit
-        query = """
+        if cursor:
+            keyset = "WHERE (t.timestamp, t.id) < ($3::timestamp, $4::uuid)"
+            params = decode_cursor(cursor, datetime.fromisoformat)
+            offset = 0
+        else:
+            keyset = ""
+            params = ()
+            offset = (page - 1) * limit
+        query = f"""
             SELECT t.id, t.from_account_id, t.to_account_id, t.amount, t.transaction_type, 
                    t.timestamp, t.is_anomaly, t.anomaly_score, t.anomaly_reasons,
                    a1.account_number as from_account, a2.account_number as to_account
             FROM transactions t
             JOIN accounts a1 ON t.from_account_id = a1.id
             JOIN accounts a2 ON t.to_account_id = a2.id
-            ORDER BY t.timestamp DESC
-            LIMIT %s OFFSET %s
+            {keyset}
+            ORDER BY t.timestamp DESC, t.id DESC
+            LIMIT $1 OFFSET $2
         """
-        cursor.execute(query, (limit, offset))
+        # One extra row tells whether there is a next page
+        rows = await async_db.fetch(query, limit + 1, offset, *params)
+        next_cursor = encode_cursor(rows[limit - 1][5], rows[limit - 1][0]) if len(rows) > limit else None
+        rows = rows[:limit]
         transactions = [
             {
                 "id": str(row[0]),  # Convert UUID to string
@@ -448,28 +521,32 @@ async def get_transactions(page: int = Query(1, ge=1), limit: int = Query(50, ge
                 "anomaly_score": float(row[7]) if row[7] else 0,
                 "anomaly_reasons": row[8] or []
             }
-            for row in cursor.fetchall()
+            for row in rows
         ]
         
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        total = cursor.fetchone()[0]
+        # Trigger-maintained count instead of a COUNT(*) scan per page
+        total = (await read_counters(async_db))['total_count']
         pages = (total + limit - 1) // limit
         
-        cursor.close()
-        conn.close()
-        
-        return {"transactions": transactions, "pages": pages}
+        return {"transactions": transactions, "pages": pages, "total": total, "next_cursor": next_cursor}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 @app.get("/api/anomalies")
-async def get_anomalies(page: int = Query(1, ge=1), limit: int = Query(50, ge=1, le=100)):
+async def get_anomalies(page: int = Query(1, ge=1), limit: int = Query(50, ge=1, le=100),
+                        cursor: Optional[str] = None):
+    """Highest score first. Pass the returned ``next_cursor`` to fetch the following page at constant
+    cost (keyset on ``(anomaly_score, id)``); ``page`` alone still works but uses OFFSET."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        offset = (page - 1) * limit
-        query = """
+        if cursor:
+            keyset = "AND (t.anomaly_score, t.id) < ($3::numeric, $4::uuid)"
+            params = decode_cursor(cursor, Decimal)
+            offset = 0
+        else:
+            keyset = ""
+            params = ()
+            offset = (page - 1) * limit
+        query = f"""
             SELECT t.id, t.from_account_id, t.to_account_id, t.amount, t.transaction_type, 
                    t.timestamp, t.is_anomaly, t.anomaly_score, t.anomaly_reasons,
                    a1.account_number as from_account, a2.account_number as to_account
@@ -477,10 +554,13 @@ async def get_anomalies(page: int = Query(1, ge=1), limit: int = Query(50, ge=1,
             JOIN accounts a1 ON t.from_account_id = a1.id
             JOIN accounts a2 ON t.to_account_id = a2.id
             WHERE t.is_anomaly = true
-            ORDER BY t.anomaly_score DESC
-            LIMIT %s OFFSET %s
+            {keyset}
+            ORDER BY t.anomaly_score DESC, t.id DESC
+            LIMIT $1 OFFSET $2
         """
-        cursor.execute(query, (limit, offset))
+        rows = await async_db.fetch(query, limit + 1, offset, *params)
+        next_cursor = encode_cursor(rows[limit - 1][7], rows[limit - 1][0]) if len(rows) > limit else None
+        rows = rows[:limit]
         anomalies = [
             {
                 "id": str(row[0]),  # Convert UUID to string
@@ -494,23 +574,19 @@ async def get_anomalies(page: int = Query(1, ge=1), limit: int = Query(50, ge=1,
                 "anomaly_score": float(row[7]) if row[7] else 0,
                 "anomaly_reasons": row[8] or []
             }
-            for row in cursor.fetchall()
+            for row in rows
         ]
         
-        cursor.execute("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true")
-        total = cursor.fetchone()[0]
+        total = (await read_counters(async_db))['anomaly_count']
         pages = (total + limit - 1) // limit
         
-        cursor.close()
-        conn.close()
-        
-        return {"anomalies": anomalies, "pages": pages}
+        return {"anomalies": anomalies, "pages": pages, "total": total, "next_cursor": next_cursor}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 # UPDATED: now uses network_analyzer and handles optional days parameter
 @app.get("/api/network/data")
-async def get_network_data(days: int = Query(None, ge=1, le=365)):
+def get_network_data(days: int = Query(None, ge=1, le=365)):
     try:
         if days is None:
             logger.info("Fetching network data for all historical data (no date filter)...")
@@ -538,26 +614,12 @@ async def get_network_data(days: int = Query(None, ge=1, le=365)):
 @app.get("/api/analytics")
 async def get_analytics():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        total_transactions = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true")
-        total_fraud = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT SUM(amount) FROM transactions")
-        total_amount = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT SUM(amount) FROM transactions WHERE is_anomaly = true")
-        fraud_amount = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT AVG(anomaly_score) FROM transactions WHERE is_anomaly = true")
-        avg_anomaly_score = cursor.fetchone()[0] or 0
-        
-        cursor.close()
-        conn.close()
+        counters = await read_counters(async_db)
+        total_transactions = counters['total_count']
+        total_fraud = counters['anomaly_count']
+        total_amount = counters['total_volume']
+        fraud_amount = counters['fraud_volume']
+        avg_anomaly_score = counters['avg_anomaly_score']
         
         return {
             "summary_stats": {
@@ -566,11 +628,11 @@ async def get_analytics():
                 "fraud_rate": round((total_fraud / total_transactions * 100), 2) if total_transactions else 0,
                 "total_amount": float(total_amount),
                 "fraud_amount": float(fraud_amount),
-                "avg_anomaly_score": round(avg_anomaly_score, 2)
+                "avg_anomaly_score": round(float(avg_anomaly_score), 2)
             }
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 # ... (keep the rest of your endpoints unchanged)
 
@@ -578,12 +640,9 @@ async def get_analytics():
 @app.get("/api/analytics/anomaly-trends")
 async def get_anomaly_trends(days: int = Query(None, ge=1)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         if days is None:
             logger.info("Fetching anomaly trends for all historical data...")
-            cursor.execute("""
+            rows = await async_db.fetch("""
                 SELECT DATE_TRUNC('day', timestamp) as date, 
                        COUNT(*) as total, 
                        SUM(CASE WHEN is_anomaly THEN 1 ELSE 0 END) as anomalies
@@ -594,16 +653,16 @@ async def get_anomaly_trends(days: int = Query(None, ge=1)):
             """)
         else:
             logger.info(f"Fetching anomaly trends for last {days} days...")
-            cursor.execute("""
+            rows = await async_db.fetch("""
                 SELECT DATE_TRUNC('day', timestamp) as date, 
                        COUNT(*) as total, 
                        SUM(CASE WHEN is_anomaly THEN 1 ELSE 0 END) as anomalies
                 FROM transactions
-                WHERE timestamp >= CURRENT_DATE - INTERVAL %s
+                WHERE timestamp >= $1
                 GROUP BY DATE_TRUNC('day', timestamp)
                 ORDER BY date DESC
                 LIMIT 100
-            """, (f"{days} days",))
+            """, datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days))
         
         trends = [
             {
@@ -612,23 +671,17 @@ async def get_anomaly_trends(days: int = Query(None, ge=1)):
                 "anomalies": row[2],
                 "anomaly_rate": round((row[2] / row[1] * 100), 2) if row[1] else 0
             }
-            for row in cursor.fetchall()
+            for row in rows
         ]
         
-        cursor.close()
-        conn.close()
-        
         return {"trends": trends}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 @app.get("/api/analytics/detection-methods")
 async def get_detection_methods():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        rows = await async_db.fetch("""
             SELECT detection_method, COUNT(*) as count
             FROM anomaly_detections
             GROUP BY detection_method
@@ -645,88 +698,57 @@ async def get_detection_methods():
                     "rule_based": "#ef4444"
                 }.get(row[0], "#6b7280")
             }
-            for row in cursor.fetchall()
+            for row in rows
         ]
         
-        cursor.close()
-        conn.close()
-        
         return methods
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 @app.put("/api/anomalies/{anomaly_id}/status")
 async def update_anomaly_status(anomaly_id: str, status: str):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         valid_statuses = ["pending", "investigating", "confirmed", "false_positive"]
         if status not in valid_statuses:
             raise HTTPException(status_code=400, detail="Invalid status")
         
-        cursor.execute("""
+        updated = await async_db.fetchval("""
             UPDATE anomaly_detections
-            SET status = %s
-            WHERE transaction_id = %s
+            SET status = $1
+            WHERE transaction_id = $2::uuid
             RETURNING id
-        """, (status, anomaly_id))
+        """, status, anomaly_id)
         
-        if not cursor.fetchone():
+        if not updated:
             raise HTTPException(status_code=404, detail="Anomaly not found")
         
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
         return {"message": f"Anomaly {anomaly_id} status updated to {status}"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 @app.get("/api/realtime/data")
 async def get_realtime_data():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        total_transactions = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true")
-        anomalies_detected = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT SUM(amount) FROM transactions")
-        total_volume = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT AVG(EXTRACT(EPOCH FROM (detection_time - timestamp))) FROM anomaly_detections ad JOIN transactions t ON ad.transaction_id = t.id")
-        avg_detection_time = cursor.fetchone()[0] or 2.3
-        
-        cursor.close()
-        conn.close()
+        counters = await read_counters(async_db)
         
         return {
-            "active_transactions": total_transactions,
-            "anomalies_detected": anomalies_detected,
-            "total_volume": float(total_volume),
-            "avg_detection_time": round(avg_detection_time, 1),
+            "active_transactions": counters['total_count'],
+            "anomalies_detected": counters['anomaly_count'],
+            "total_volume": float(counters['total_volume']),
+            "avg_detection_time": round(float(counters['avg_detection_seconds']), 1),
             "system_health": "healthy",
             "last_update": datetime.now().isoformat()
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise database_error(e)
 
 @app.websocket("/ws/realtime")
 async def websocket_realtime(websocket: WebSocket):
     await websocket.accept()
-    conn = None
-    cursor = None
     try:
         while True:
             try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute("""
+                row = await async_db.fetchrow("""
                     SELECT t.id, t.from_account_id, t.to_account_id, t.amount, t.transaction_type, 
                            t.timestamp, t.is_anomaly, t.anomaly_score,
                            a1.account_number as from_account, a2.account_number as to_account
@@ -736,7 +758,6 @@ async def websocket_realtime(websocket: WebSocket):
                     ORDER BY t.timestamp DESC
                     LIMIT 1
                 """)
-                row = cursor.fetchone()
                 latest_transaction = {
                     "id": str(row[0]) if row else None,  # Convert UUID to string
                     "transaction_id": f"TXN{row[0]}" if row else None,
@@ -749,17 +770,7 @@ async def websocket_realtime(websocket: WebSocket):
                     "anomaly_score": float(row[7]) if row and row[7] else 0
                 } if row else None
                 
-                cursor.execute("SELECT COUNT(*) FROM transactions")
-                total_transactions = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM transactions WHERE is_anomaly = true")
-                anomalies_detected = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT SUM(amount) FROM transactions")
-                total_volume = cursor.fetchone()[0] or 0
-                
-                cursor.execute("SELECT AVG(EXTRACT(EPOCH FROM (detection_time - timestamp))) FROM anomaly_detections ad JOIN transactions t ON ad.transaction_id = t.id")
-                avg_detection_time = cursor.fetchone()[0] or 2.3
+                counters = await read_counters(async_db)
                 
                 new_alert = None
                 if latest_transaction and latest_transaction["is_anomaly"] and random.random() > 0.7:
@@ -770,16 +781,11 @@ async def websocket_realtime(websocket: WebSocket):
                         "timestamp": datetime.now().isoformat()
                     }
                 
-                cursor.close()
-                conn.close()
-                conn = None
-                cursor = None
-                
                 await websocket.send_json({
-                    "active_transactions": total_transactions,
-                    "anomalies_detected": anomalies_detected,
-                    "total_volume": float(total_volume),
-                    "avg_detection_time": round(avg_detection_time, 1),
+                    "active_transactions": counters['total_count'],
+                    "anomalies_detected": counters['anomaly_count'],
+                    "total_volume": float(counters['total_volume']),
+                    "avg_detection_time": round(float(counters['avg_detection_seconds']), 1),
                     "system_health": "healthy",
                     "last_update": datetime.now().isoformat(),
                     "latest_transaction": latest_transaction,
@@ -796,20 +802,135 @@ async def websocket_realtime(websocket: WebSocket):
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
         await websocket.close()
 
-@app.post("/api/detect")
-async def run_detection():
+def run_detection_job(job, mode, batch_size):
+    """Body of a detection job; runs on the job manager's worker thread"""
+    job_detector = get_detector()
+    job.detector = job_detector
+    try:
+        if mode == "stream":
+            summary = job_detector.run_streaming_detection(chunk_size=batch_size)
+            anomaly_count = summary['anomalies']
+        elif mode == "incremental":
+            anomaly_count = len(job_detector.run_incremental_detection(batch_size=batch_size))
+        else:
+            anomaly_count = len(job_detector.run_detection())
+    finally:
+        with detector_lock:
+            replaced = job_detector is not detector
+        if replaced:
+            # A new model version was published while this job ran
+            job_detector.disable_parallel_scoring()
+    return {
+        "anomalies": anomaly_count,
+        "rows_scored": job_detector.progress['rows_scored'],
+        "batches": job_detector.progress['batches'],
+        "model_version": job_detector.model_version,
+        "write_stats": job_detector.write_stats
+    }
+
+@app.post("/api/detect", status_code=202)
+async def run_detection(mode: str = Query("incremental", pattern="^(incremental|sample|stream)$"),
+                        batch_size: int = Query(10000, ge=1, le=100000)):
+    if model_store.current_version() is None:
+        raise HTTPException(status_code=409, detail="No trained model available; POST /api/models/train first")
+    try:
+        job = detection_jobs.submit(
+            mode, {"batch_size": batch_size},
+            lambda job: run_detection_job(job, mode, batch_size)
+        )
+    except JobAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job.id})
+    return {
+        "message": f"Detection job {job.id} started.",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/detect/{job.id}"
+    }
+
+@app.get("/api/detect/{job_id}")
+async def get_detection_job(job_id: str):
+    job = detection_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Detection job not found")
+    return job.to_dict()
+
+class ScoreTransaction(BaseModel):
+    id: Optional[str] = None
+    from_account: str
+    to_account: str
+    amount: float = Field(allow_inf_nan=False)
+    transaction_type: str = "unknown"
+    timestamp: Optional[datetime] = None
+
+def score_records(records):
+    """Inference-thread entry point for the micro-batching scheduler"""
+    return get_detector().score_records(records)
+
+inference_scheduler = InferenceScheduler(
+    score_records,
+    max_batch_size=int(os.getenv('SCORE_MAX_BATCH_SIZE', '64')),
+    max_wait_ms=float(os.getenv('SCORE_MAX_WAIT_MS', '2'))
+)
+
+@app.on_event("shutdown")
+async def stop_inference_scheduler():
+    await inference_scheduler.stop()
+
+@app.on_event("shutdown")
+async def close_async_db():
+    await async_db.close()
+
+@app.post("/api/score")
+async def score_transactions(payload: Union[ScoreTransaction, List[ScoreTransaction]]):
+    """Score one transaction or a small list inline, from preloaded models and in-memory state"""
+    start = time.perf_counter()
+    transactions = payload if isinstance(payload, list) else [payload]
+    if not 1 <= len(transactions) <= MAX_SCORE_BATCH:
+        raise HTTPException(status_code=422, detail=f"Expected between 1 and {MAX_SCORE_BATCH} transactions")
+    if model_store.current_version() is None:
+        raise HTTPException(status_code=409, detail="No trained model available; POST /api/models/train first")
     try:
-        detector = TransactionAnomalyDetector(DB_CONFIG)
-        anomalies = detector.run_detection()
-        return {"message": f"Detection completed. Found {len(anomalies)} anomalies."}
+        results = await inference_scheduler.submit([transaction.model_dump() for transaction in transactions])
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
+        logger.error(f"Error scoring transactions: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    elapsed = time.perf_counter() - start
+    stage_latencies.observe('realtime_score', elapsed)
+    return {
+        "results": results if isinstance(payload, list) else results[0],
+        # From the detector that produced the scores; a model swap may have happened since
+        "model_version": results[0]['model_version'],
+        "latency_ms": round(elapsed * 1000, 3)
+    }
+
+@app.get("/api/score/stats")
+async def get_score_stats():
+    return inference_scheduler.stats()
+
+@app.get("/api/rules")
+async def get_rules():
+    """Active detection rules (hot-reloaded from RULES_PATH) with per-rule hit counts and evaluation time"""
+    return rule_engine.stats()
+
+@app.post("/api/models/train")
+def train_models(limit: int = Query(10000, ge=1)):
+    try:
+        trainer = TransactionAnomalyDetector(DB_CONFIG, model_store=model_store)
+        version = trainer.train(limit=limit)
+        return {"message": "Training completed", "version": version}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/models")
+async def get_models():
+    return {
+        "current_version": model_store.current_version(),
+        "versions": model_store.list_versions()
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+from dotenv import load_dotenv
+
+from db_instrumentation import query_log, statement_type
+from db_pool import PoolTimeoutError
+from prometheus_metrics import DB_CONNECT_DURATION, DB_QUERY_DURATION
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# The database is unreachable or refusing connections
+CONNECTION_ERRORS = (
+    asyncpg.PostgresConnectionError,
+    asyncpg.ConnectionDoesNotExistError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+    OSError
+)
+# Errors after which the statement is retried on a fresh connection
+TRANSIENT_ERRORS = CONNECTION_ERRORS + (asyncpg.SerializationError, asyncpg.DeadlockDetectedError)
+
+
+class AsyncDatabase:
+    """asyncpg connection pool for the API's request handlers.
+
+    Queries are awaited on the event loop instead of blocking it, so the number
+    of in-flight queries is bounded by the pool (``ASYNC_DB_POOL_MAX``) rather
+    than by one per process. The pool is created on first use; acquiring waits
+    at most ``DB_POOL_TIMEOUT`` seconds and then raises PoolTimeoutError.
+    Transient errors (lost connections, serialization failures, deadlocks) are
+    retried on a fresh connection with exponential backoff. Every
+    statement is timed into the query-duration histogram and ``query_log``.
+    Placeholders are asyncpg's ``$1, $2, ...``.
+    """
+
+    def __init__(self, db_config, min_size=None, max_size=None, timeout=None, max_retries=3):
+        self.db_config = db_config
+        self.min_size = min_size if min_size is not None else int(os.getenv('ASYNC_DB_POOL_MIN', '2'))
+        self.max_size = max_size if max_size is not None else int(os.getenv('ASYNC_DB_POOL_MAX', '20'))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', '5'))
+        self.max_retries = max_retries
+        self.pool = None
+        self.lock = None
+        self.counters = {'acquired': 0, 'timeouts': 0, 'retries': 0, 'wait_seconds': 0.0}
+
+    async def start(self):
+        if self.pool is not None:
+            return self.pool
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    host=self.db_config['host'],
+                    port=int(self.db_config['port']),
+                    user=self.db_config['user'],
+                    password=self.db_config['password'],
+                    database=self.db_config['database'],
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    max_inactive_connection_lifetime=float(os.getenv('DB_POOL_MAX_IDLE_SECONDS', '600'))
+                )
+                logger.info(f"Async database pool started ({self.min_size}-{self.max_size} connections)")
+        return self.pool
+
+    async def close(self):
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            await pool.close()
+
+    @asynccontextmanager
+    async def acquire(self):
+        pool = await self.start()
+        start = time.perf_counter()
+        try:
+            conn = await pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            raise PoolTimeoutError(f"No database connection available within {self.timeout:.1f}s "
+                                   f"({pool.get_size()}/{self.max_size} in use)")
+        elapsed = time.perf_counter() - start
+        DB_CONNECT_DURATION.observe(elapsed)
+        self.counters['acquired'] += 1
+        self.counters['wait_seconds'] += elapsed
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    async def _run(self, method, query, args):
+        for attempt in range(self.max_retries):
+            try:
+                async with self.acquire() as conn:
+                    start = time.perf_counter()
+                    try:
+                        result = await getattr(conn, method)(query, *args)
+                    finally:
+                        elapsed = time.perf_counter() - start
+                        DB_QUERY_DURATION.observe(elapsed, statement_type(query))
+                    query_log.record(None, query, args, elapsed)
+                    return result
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                self.counters['retries'] += 1
+                logger.warning(f"Database operation failed, retrying... (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(0.1 * (2 ** attempt))  # Exponential backoff
+
+    async def fetch(self, query, *args):
+        return await self._run('fetch', query, args)
+
+    async def fetchrow(self, query, *args):
+        return await self._run('fetchrow', query, args)
+
+    async def fetchval(self, query, *args):
+        return await self._run('fetchval', query, args)
+
+    async def execute(self, query, *args):
+        return await self._run('execute', query, args)
+
+    def stats(self):
+        acquired = self.counters['acquired']
+        pool = self.pool
+        return {
+            'started': pool is not None,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'size': pool.get_size() if pool is not None else 0,
+            'idle': pool.get_idle_size() if pool is not None else 0,
+            'acquired': acquired,
+            'timeouts': self.counters['timeouts'],
+            'retries': self.counters['retries'],
+            'avg_acquire_ms': round(self.counters['wait_seconds'] / acquired * 1000, 3) if acquired else 0.0
+        }
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the TransactionAnomalyDetector pipeline stages.
+
+Every (stage, size) case runs in a fresh process against a synthetic
+in-memory dataset, so no PostgreSQL is needed. Memory is reported per stage:
+the process RSS is sampled while the stage runs, and ``stage_rss_mb`` is its
+peak above the RSS right before the stage (after data generation and training).
+Results are written as JSON tagged with the current git commit, e.g.:
+
+    python benchmarks/benchmark_pipeline.py --sizes 10000 100000 1000000
+    python benchmarks/benchmark_pipeline.py --compare benchmarks/results/<older>.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+STAGES = ['preprocess', 'statistical', 'ml', 'supervised', 'network', 'score', 'training', 'writeback']
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def synthetic_transactions(rows, seed=42):
+    """Synthetic frame, with injected fraud patterns, in the shape the detector loads from PostgreSQL"""
+    from synthetic_data import SyntheticDataGenerator
+
+    return SyntheticDataGenerator(rows, seed=seed).detector_frame()
+
+
+class OfflineConnection:
+    """The part of a psycopg2 connection ``execute_values`` reads: the client encoding"""
+
+    encoding = 'UTF8'
+
+
+class OfflineCursor:
+    """Stands in for a psycopg2 cursor: statements are fully rendered client-side but not sent"""
+
+    def __init__(self):
+        self.connection = OfflineConnection()
+        self.statements = 0
+        self.bytes = 0
+
+    def mogrify(self, template, args):
+        from psycopg2.extensions import adapt
+        return (template % tuple(adapt(arg).getquoted().decode() for arg in args)).encode()
+
+    def execute(self, query, params=None):
+        self.statements += 1
+        self.bytes += len(query)
+
+
+def make_detector(frame, work_dir):
+    from anomaly_detector import TransactionAnomalyDetector
+    from feature_store import AccountFeatureStore
+    from model_store import ModelStore
+
+    class InMemoryDetector(TransactionAnomalyDetector):
+        """Detector whose data source is an in-process DataFrame"""
+
+        def load_data(self, limit=10000):
+            return frame.head(limit).copy()
+
+        def fetch_pair_counts(self, df):
+            return self.pair_counts_from_frame(frame)
+
+    return InMemoryDetector(
+        None,
+        model_store=ModelStore(os.path.join(work_dir, 'models')),
+        feature_store=AccountFeatureStore()
+    )
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def current_rss_mb():
+    """Resident set size right now, or None where ``/proc`` is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * resource.getpagesize() / (1024 * 1024)
+
+
+class StageMemory:
+    """Peak RSS while a block runs, sampled from a background thread.
+
+    ``ru_maxrss`` is the whole process's high-water mark, which the data
+    generation and training before a stage usually set; sampling the current
+    RSS attributes memory to the stage itself. Memory the allocator kept from
+    the setup is reused without growing RSS, so this is the stage's footprint
+    on top of the setup, not its total allocation. Without ``/proc`` it falls
+    back to ``ru_maxrss``, which only shows growth beyond the earlier peak.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.sampled = current_rss_mb() is not None
+        self.stopped = threading.Event()
+        self.before = self.peak = 0.0
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        gc.collect()
+        if self.sampled:
+            self.before = self.peak = current_rss_mb()
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+        else:
+            self.before = peak_rss_mb()
+        return self
+
+    def __exit__(self, *exc):
+        if self.sampled:
+            self.stopped.set()
+            self.thread.join()
+            self.peak = max(self.peak, current_rss_mb())
+        else:
+            self.peak = peak_rss_mb()
+        return False
+
+
+def run_case(stage, rows, train_rows, writeback_fraction, seed):
+    """Run one stage at one size in the current (fresh) process and return its measurements"""
+    from typed_frames import memory_per_row
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ['STATS_STATE_PATH'] = os.path.join(work_dir, 'streaming_stats.json')
+        frame = synthetic_transactions(rows, seed)
+        detector = make_detector(frame, work_dir)
+
+        if stage == 'training':
+            sample_rows = min(rows, train_rows)
+            with StageMemory() as memory:
+                start = time.perf_counter()
+                detector.train(limit=sample_rows)
+                elapsed = time.perf_counter() - start
+            return measurement(stage, rows, sample_rows, elapsed, memory)
+
+        detector.train(limit=min(rows, train_rows))
+        detector.load_models()
+        df = frame.copy()
+        if stage not in ('preprocess', 'score'):
+            detector.attach_account_features(df)
+            X, ids = detector.preprocess_data(df)
+
+        with StageMemory() as memory:
+            start = time.perf_counter()
+            if stage == 'preprocess':
+                detector.attach_account_features(df)
+                detector.preprocess_data(df)
+            elif stage == 'statistical':
+                detector.detect_statistical_anomalies(X, df['from_account'], df['amount'])
+                detector.stat_detector.update(X, df['from_account'], df['amount'])
+            elif stage == 'ml':
+                detector.detect_ml_anomalies(X)
+            elif stage == 'supervised':
+                detector.detect_supervised_anomalies(X)
+            elif stage == 'network':
+                detector.detect_network_anomalies(df)
+            elif stage == 'score':
+                detector.score(df)
+            elif stage == 'writeback':
+                flagged = max(int(rows * writeback_fraction), 1)
+                detector.result_writer.write(OfflineCursor(), ids.iloc[:flagged], X['amount_scaled'].iloc[:flagged])
+                rows = flagged
+            elapsed = time.perf_counter() - start
+        result = measurement(stage, len(frame), rows, elapsed, memory)
+        result['frame_bytes_per_row'] = round(memory_per_row(frame), 1)
+        return result
+
+
+def measurement(stage, dataset_rows, rows, elapsed, memory):
+    return {
+        'stage': stage,
+        'dataset_rows': dataset_rows,
+        'rows': rows,
+        'seconds': round(elapsed, 6),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'latency_ms': round(elapsed * 1000, 3),
+        'rss_before_mb': round(memory.before, 1),
+        'peak_rss_mb': round(memory.peak, 1),
+        'stage_rss_mb': round(memory.peak - memory.before, 1)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    previous = {(r['stage'], r['dataset_rows']): r for r in baseline['results']}
+    print(f"\nComparison against {baseline.get('commit')} ({baseline_path}):")
+    for result in current['results']:
+        old = previous.get((result['stage'], result['dataset_rows']))
+        if old and old['seconds'] and result['seconds']:
+            speedup = old['seconds'] / result['seconds']
+            memory = f"{result['stage_rss_mb'] - old['stage_rss_mb']:+8.1f} MB stage RSS" \
+                if 'stage_rss_mb' in old else f"{result['peak_rss_mb'] - old['peak_rss_mb']:+8.1f} MB peak RSS"
+            print(f"  {result['stage']:<12} {result['dataset_rows']:>10,} rows  {speedup:6.2f}x time  {memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the anomaly detection pipeline stages offline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Dataset sizes in rows")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--train-rows', type=int, default=100_000,
+                        help="Cap on training sample size, as in production training runs")
+    parser.add_argument('--writeback-fraction', type=float, default=0.01,
+                        help="Share of rows written back as anomalies in the writeback stage")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="Result JSON path (default: benchmarks/results/)")
+    parser.add_argument('--compare', default=None, help="Earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': vars(args),
+        'results': []
+    }
+
+    for rows in args.sizes:
+        for stage in args.stages:
+            # Fresh process per case so allocator state is not shared between cases
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                result = executor.submit(run_case, stage, rows, args.train_rows,
+                                         args.writeback_fraction, args.seed).result()
+            report['results'].append(result)
+            print(f"{stage:<12} {rows:>10,} rows  {result['seconds']:10.3f}s  "
+                  f"{result['rows_per_sec'] or 0:>14,.0f} rows/s  {result['stage_rss_mb']:+8.1f} MB stage")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(report['commit'] or 'unknown')[:8]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
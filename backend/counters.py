@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Running totals over ``transactions`` and ``accounts``, kept exact by statement-level triggers.
+
+Each INSERT/UPDATE/DELETE statement (COPY included) folds the aggregates of
+its transition tables into ``transaction_counters``; statements on
+``anomaly_detections`` likewise maintain the detection-latency totals the
+dashboard averages. Reading the totals is
+a sum over ``COUNTER_SLOTS`` rows instead of a table scan. The counters are
+spread over several slot rows, chosen by backend pid, so concurrent writers
+do not queue on a single row lock until commit.
+
+    python counters.py install   # create the table, functions and triggers, then rebuild
+    python counters.py rebuild   # recompute the totals from the tables
+    python counters.py show
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+COUNTER_SLOTS = 16
+
+# Aggregate over a set of transactions rows; each one is additive, so a statement's
+# delta is aggregate(new rows) - aggregate(old rows)
+TRANSACTION_AGGREGATES = {
+    'total_count': "COUNT(*)",
+    'anomaly_count': "COUNT(*) FILTER (WHERE is_anomaly)",
+    'total_volume': "COALESCE(SUM(amount), 0)",
+    'fraud_volume': "COALESCE(SUM(amount) FILTER (WHERE is_anomaly), 0)",
+    'anomaly_score_sum': "COALESCE(SUM(anomaly_score) FILTER (WHERE is_anomaly), 0)",
+    'detected_count': "COUNT(*) FILTER (WHERE detection_time IS NOT NULL AND timestamp IS NOT NULL)",
+    'detection_seconds_sum': "COALESCE(SUM(EXTRACT(EPOCH FROM (detection_time - timestamp))), 0)"
+}
+# Aggregate over a set of anomaly_detections rows (alias d) joined to their transactions (alias t)
+DETECTION_AGGREGATES = {
+    'detection_latency_count': "COUNT(*)",
+    'detection_latency_sum': "COALESCE(SUM(EXTRACT(EPOCH FROM (d.detected_at - t.timestamp))), 0)"
+}
+COUNTER_COLUMNS = list(TRANSACTION_AGGREGATES) + list(DETECTION_AGGREGATES) + ['account_count']
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS transaction_counters (
+        slot SMALLINT PRIMARY KEY,
+        total_count BIGINT NOT NULL DEFAULT 0,
+        anomaly_count BIGINT NOT NULL DEFAULT 0,
+        total_volume NUMERIC NOT NULL DEFAULT 0,
+        fraud_volume NUMERIC NOT NULL DEFAULT 0,
+        anomaly_score_sum NUMERIC NOT NULL DEFAULT 0,
+        detected_count BIGINT NOT NULL DEFAULT 0,
+        detection_seconds_sum NUMERIC NOT NULL DEFAULT 0,
+        detection_latency_count BIGINT NOT NULL DEFAULT 0,
+        detection_latency_sum NUMERIC NOT NULL DEFAULT 0,
+        account_count BIGINT NOT NULL DEFAULT 0
+    )
+"""
+
+# Tables created before the detection-latency totals existed
+ADD_COLUMNS = [
+    "ALTER TABLE transaction_counters ADD COLUMN IF NOT EXISTS detection_latency_count BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE transaction_counters ADD COLUMN IF NOT EXISTS detection_latency_sum NUMERIC NOT NULL DEFAULT 0"
+]
+
+SLOT = f"pg_backend_pid() % {COUNTER_SLOTS}"
+
+
+def aggregate_select(source):
+    columns = ',\n               '.join(f"{expression} AS {name}" for name, expression in TRANSACTION_AGGREGATES.items())
+    return f"SELECT {columns}\n        FROM {source}"
+
+
+def detection_select(source):
+    columns = ',\n               '.join(f"{expression} AS {name}" for name, expression in DETECTION_AGGREGATES.items())
+    return f"""SELECT {columns}
+        FROM {source} d JOIN transactions t ON t.id = d.transaction_id
+        WHERE d.detected_at IS NOT NULL AND t.timestamp IS NOT NULL"""
+
+
+def apply_delta(added=None, removed=None, slot=SLOT, aggregates=TRANSACTION_AGGREGATES, select=aggregate_select):
+    """``UPDATE transaction_counters`` by aggregate(``added``) - aggregate(``removed``) (table names or queries)"""
+    sources, assignments = [], []
+    for name in aggregates:
+        expression = f"c.{name}"
+        if added:
+            expression += f" + n.{name}"
+        if removed:
+            expression += f" - o.{name}"
+        assignments.append(f"{name} = {expression}")
+    if added:
+        sources.append(f"({select(added)}) n")
+    if removed:
+        sources.append(f"({select(removed)}) o")
+    return f"""
+        UPDATE transaction_counters c SET
+            {', '.join(assignments)}
+        FROM {', '.join(sources)}
+        WHERE c.slot = {slot}
+    """
+
+
+def trigger_function(name, body):
+    return f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $fn$
+        BEGIN
+            {body};
+            RETURN NULL;
+        END
+        $fn$
+    """
+
+
+FUNCTIONS = [
+    trigger_function('transaction_counters_insert', apply_delta(added='new_rows')),
+    trigger_function('transaction_counters_update', apply_delta(added='new_rows', removed='old_rows')),
+    trigger_function('transaction_counters_delete', apply_delta(removed='old_rows')),
+    trigger_function('transaction_counters_truncate', "UPDATE transaction_counters SET " + ', '.join(
+        f"{name} = 0" for name in TRANSACTION_AGGREGATES)),
+    trigger_function('detection_counters_insert', apply_delta(
+        added='new_rows', aggregates=DETECTION_AGGREGATES, select=detection_select)),
+    trigger_function('detection_counters_update', apply_delta(
+        added='new_rows', removed='old_rows', aggregates=DETECTION_AGGREGATES, select=detection_select)),
+    trigger_function('detection_counters_delete', apply_delta(
+        removed='old_rows', aggregates=DETECTION_AGGREGATES, select=detection_select)),
+    trigger_function('detection_counters_truncate', "UPDATE transaction_counters SET " + ', '.join(
+        f"{name} = 0" for name in DETECTION_AGGREGATES)),
+    trigger_function('account_counters_insert', f"""UPDATE transaction_counters
+            SET account_count = account_count + (SELECT COUNT(*) FROM new_rows) WHERE slot = {SLOT}"""),
+    trigger_function('account_counters_delete', f"""UPDATE transaction_counters
+            SET account_count = account_count - (SELECT COUNT(*) FROM old_rows) WHERE slot = {SLOT}"""),
+    trigger_function('account_counters_truncate', "UPDATE transaction_counters SET account_count = 0")
+]
+
+# Transition tables allow only one event per trigger, hence one trigger per event
+TRIGGERS = [
+    ('transactions', 'transaction_counters_insert', "AFTER INSERT", "REFERENCING NEW TABLE AS new_rows"),
+    ('transactions', 'transaction_counters_update', "AFTER UPDATE",
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ('transactions', 'transaction_counters_delete', "AFTER DELETE", "REFERENCING OLD TABLE AS old_rows"),
+    ('transactions', 'transaction_counters_truncate', "AFTER TRUNCATE", ""),
+    ('anomaly_detections', 'detection_counters_insert', "AFTER INSERT", "REFERENCING NEW TABLE AS new_rows"),
+    ('anomaly_detections', 'detection_counters_update', "AFTER UPDATE",
+     "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ('anomaly_detections', 'detection_counters_delete', "AFTER DELETE", "REFERENCING OLD TABLE AS old_rows"),
+    ('anomaly_detections', 'detection_counters_truncate', "AFTER TRUNCATE", ""),
+    ('accounts', 'account_counters_insert', "AFTER INSERT", "REFERENCING NEW TABLE AS new_rows"),
+    ('accounts', 'account_counters_delete', "AFTER DELETE", "REFERENCING OLD TABLE AS old_rows"),
+    ('accounts', 'account_counters_truncate', "AFTER TRUNCATE", "")
+]
+
+READ_COUNTERS = "SELECT " + ', '.join(
+    f"SUM({name})::{'float8' if 'volume' in name or 'sum' in name else 'bigint'} AS {name}"
+    for name in COUNTER_COLUMNS
+) + " FROM transaction_counters"
+
+# Same result computed from the tables, for databases without the counters
+COMPUTE_COUNTERS = "SELECT " + ', '.join(
+    f"t.{name}::{'float8' if 'volume' in name or 'sum' in name else 'bigint'} AS {name}"
+    for name in TRANSACTION_AGGREGATES
+) + ''.join(
+    f", d.{name}::{'float8' if 'sum' in name else 'bigint'} AS {name}" for name in DETECTION_AGGREGATES
+) + f", (SELECT COUNT(*) FROM accounts) AS account_count FROM ({aggregate_select('transactions')}) t, " \
+    f"({detection_select('anomaly_detections')}) d"
+
+UNDEFINED_TABLE = '42P01'
+# Counters installed before the detection-latency columns were added
+UNDEFINED_COLUMN = '42703'
+
+
+def rebuild_counters(cursor):
+    """Recompute every counter from the tables; writes are blocked until the caller commits"""
+    cursor.execute("LOCK TABLE transactions, accounts, anomaly_detections IN SHARE MODE")
+    cursor.execute("DELETE FROM transaction_counters")
+    cursor.execute("INSERT INTO transaction_counters (slot) SELECT generate_series(0, %s)", (COUNTER_SLOTS - 1,))
+    cursor.execute(apply_delta(added='transactions', slot=0))
+    cursor.execute(apply_delta(added='anomaly_detections', slot=0, aggregates=DETECTION_AGGREGATES,
+                               select=detection_select))
+    cursor.execute("UPDATE transaction_counters SET account_count = (SELECT COUNT(*) FROM accounts) WHERE slot = 0")
+
+
+def install_counters(cursor):
+    """Create (or replace) the counters table, trigger functions and triggers, then rebuild the totals"""
+    cursor.execute(CREATE_TABLE)
+    for statement in ADD_COLUMNS:
+        cursor.execute(statement)
+    for function in FUNCTIONS:
+        cursor.execute(function)
+    for table, name, event, referencing in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        cursor.execute(f"CREATE TRIGGER {name} {event} ON {table} {referencing} "
+                       f"FOR EACH STATEMENT EXECUTE FUNCTION {name}()")
+    rebuild_counters(cursor)
+    logger.info(f"Installed transaction counters ({COUNTER_SLOTS} slots)")
+
+
+def subtract_table(cursor, table):
+    """Take the rows of ``table`` out of the counters, for a partition about to be detached.
+
+    DETACH/DROP PARTITION fires no DELETE triggers. Moving rows between the
+    default partition and a not yet attached table addresses the partitions
+    directly, which does not fire the parent's statement triggers either, so
+    it needs no correction.
+    """
+    try:
+        cursor.execute("SAVEPOINT subtract_counters")
+        cursor.execute(apply_delta(removed=sql.Identifier(table).as_string(cursor), slot=0))
+        cursor.execute("RELEASE SAVEPOINT subtract_counters")
+    except psycopg2.errors.UndefinedTable:
+        cursor.execute("ROLLBACK TO SAVEPOINT subtract_counters")
+
+
+def counters_from_row(row):
+    counters = {name: row[name] or 0 for name in COUNTER_COLUMNS}
+    counters['avg_anomaly_score'] = counters['anomaly_score_sum'] / counters['anomaly_count'] \
+        if counters['anomaly_count'] else 0.0
+    counters['avg_detection_seconds'] = counters['detection_seconds_sum'] / counters['detected_count'] \
+        if counters['detected_count'] else 0.0
+    counters['avg_detection_latency'] = counters['detection_latency_sum'] / counters['detection_latency_count'] \
+        if counters['detection_latency_count'] else 0.0
+    return counters
+
+
+async def read_counters(db):
+    """Current totals from ``db`` (an AsyncDatabase): a read of ``COUNTER_SLOTS`` rows.
+
+    Adds ``avg_anomaly_score``, ``avg_detection_seconds`` and
+    ``avg_detection_latency``. Falls back to scanning the tables when the
+    counters are not installed (or predate the detection-latency columns).
+    """
+    try:
+        row = await db.fetchrow(READ_COUNTERS)
+        if row is None or row['total_count'] is None:
+            raise LookupError("transaction_counters is empty")
+    except Exception as e:
+        if not isinstance(e, LookupError) and getattr(e, 'sqlstate', None) not in (UNDEFINED_TABLE, UNDEFINED_COLUMN):
+            raise
+        logger.warning("transaction_counters not installed; computing totals from the tables")
+        row = await db.fetchrow(COMPUTE_COUNTERS)
+    return counters_from_row(row)
+
+
+def connect_db():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'transaction_db'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', ''),
+        port=os.getenv('DB_PORT', '5432')
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain trigger-based transaction counters")
+    parser.add_argument('command', choices=['install', 'rebuild', 'show'])
+    args = parser.parse_args()
+
+    conn = connect_db()
+    try:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        if args.command == 'install':
+            install_counters(cursor)
+        elif args.command == 'rebuild':
+            rebuild_counters(cursor)
+        conn.commit()
+        cursor.execute(READ_COUNTERS)
+        print(json.dumps(counters_from_row(cursor.fetchone()), indent=2, default=float))
+        cursor.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+from prometheus_metrics import DB_QUERY_DURATION
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+LITERAL_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+WHITESPACE = re.compile(r'\s+')
+# Batched statements (execute_values) repeat the same shape; the prefix identifies them
+NORMALIZE_PREFIX = 2048
+
+
+def statement_type(query):
+    """Leading keyword of a statement (SELECT, UPDATE, ...), used as a low-cardinality label"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        # psycopg2.sql.Composable; rendering it needs a connection, so skip the label
+        return 'OTHER'
+    words = query.lstrip(' \t\r\n(').split(None, 1)
+    return words[0].upper() if words else 'OTHER'
+
+
+def normalize_query(query):
+    """Query text with literals replaced by ``?`` and whitespace collapsed, so calls group by shape"""
+    return _normalize(query[:NORMALIZE_PREFIX])
+
+
+@lru_cache(maxsize=1024)
+def _normalize(query):
+    query = STRING_LITERAL.sub('?', query)
+    query = NUMBER_LITERAL.sub('?', query)
+    query = LITERAL_LIST.sub('(...)', query)
+    return WHITESPACE.sub(' ', query).strip()
+
+
+def query_text(query):
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query if isinstance(query, str) else repr(query)
+
+
+class QueryLog:
+    """Per-query-shape execution statistics plus a log of recent slow statements.
+
+    Statements slower than ``threshold_ms`` are logged; for a ``sample_rate``
+    share of slow read-only statements the plan is captured with
+    ``EXPLAIN (ANALYZE, BUFFERS)``, at most once per query shape every
+    ``explain_interval`` seconds since it executes the query again.
+    """
+
+    def __init__(self, threshold_ms=None, sample_rate=None, explain_interval=60.0, history_size=200):
+        self.threshold_ms = threshold_ms if threshold_ms is not None else float(os.getenv('SLOW_QUERY_MS', '200'))
+        self.sample_rate = sample_rate if sample_rate is not None else \
+            float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', '0.1'))
+        self.explain_interval = explain_interval
+        self.stats = {}
+        self.slow = deque(maxlen=history_size)
+        self.last_explained = {}
+        self.lock = threading.Lock()
+
+    def record(self, cursor, query, vars, seconds):
+        text = query_text(query)
+        normalized = normalize_query(text)
+        with self.lock:
+            stats = self.stats.get(normalized)
+            if stats is None:
+                stats = self.stats[normalized] = {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'slow_calls': 0}
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            slow = seconds * 1000 >= self.threshold_ms
+            if slow:
+                stats['slow_calls'] += 1
+        if slow:
+            entry = {
+                'query': normalized,
+                'duration_ms': round(seconds * 1000, 3),
+                'at': datetime.now().isoformat(),
+                'plan': self.maybe_explain(cursor, text, normalized, vars)
+            }
+            with self.lock:
+                self.slow.append(entry)
+            logger.warning(f"Slow query ({entry['duration_ms']} ms): {normalized[:200]}")
+
+    def maybe_explain(self, cursor, text, normalized, vars):
+        if cursor is None or not isinstance(text, str) or statement_type(text) not in ('SELECT', 'WITH') \
+                or random.random() >= self.sample_rate:
+            return None
+        # EXPLAIN ANALYZE executes the statement, so never re-run anything that writes
+        if re.search(r'\b(INSERT|UPDATE|DELETE)\b', normalized, re.IGNORECASE):
+            return None
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_explained.get(normalized, float('-inf')) < self.explain_interval:
+                return None
+            self.last_explained[normalized] = now
+        conn = cursor.connection
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            return None
+        # Inside the caller's transaction a failing EXPLAIN (e.g. a statement timeout) would
+        # abort it, so the EXPLAIN runs under a savepoint that is rolled back either way
+        savepoint = status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        # A plain cursor, so the EXPLAIN itself is neither timed nor logged
+        explain_cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+        try:
+            if savepoint:
+                explain_cursor.execute("SAVEPOINT explain_slow_query")
+            try:
+                explain_cursor.execute(b'EXPLAIN (ANALYZE, BUFFERS) ' + cursor.mogrify(text, vars))
+                return '\n'.join(row[0] for row in explain_cursor.fetchall())
+            finally:
+                if savepoint:
+                    # Also undoes any side effects of re-running the statement
+                    explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+                    explain_cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+        except Exception as e:
+            logger.warning(f"Could not capture EXPLAIN for slow query: {e}")
+            return None
+        finally:
+            explain_cursor.close()
+
+    def report(self, limit=20):
+        with self.lock:
+            stats = [dict(query=query, **values) for query, values in self.stats.items()]
+            slow = list(self.slow)
+        top = sorted(stats, key=lambda item: item['total_seconds'], reverse=True)[:limit]
+        return {
+            'threshold_ms': self.threshold_ms,
+            'explain_sample_rate': self.sample_rate,
+            'queries': [
+                {
+                    'query': item['query'],
+                    'calls': item['calls'],
+                    'slow_calls': item['slow_calls'],
+                    'total_ms': round(item['total_seconds'] * 1000, 3),
+                    'mean_ms': round(item['total_seconds'] / item['calls'] * 1000, 3),
+                    'max_ms': round(item['max_seconds'] * 1000, 3)
+                }
+                for item in top
+            ],
+            'recent_slow': slow[::-1][:limit]
+        }
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.slow.clear()
+            self.last_explained.clear()
+
+
+# Process-wide log fed by every InstrumentedCursor
+query_log = QueryLog()
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that records every ``execute``/``executemany`` in the query-duration histogram and ``query_log``"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            DB_QUERY_DURATION.observe(time.perf_counter() - start, statement_type(query))
+            raise
+        elapsed = time.perf_counter() - start
+        DB_QUERY_DURATION.observe(elapsed, statement_type(query))
+        # Server-side (named) cursors only DECLARE here; their plan cannot be re-run on the side
+        query_log.record(None if self.name else self, query, vars, elapsed)
+        return result
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_DURATION.observe(elapsed, statement_type(query))
+            query_log.record(None, query, None, elapsed)
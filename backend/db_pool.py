@@ -0,0 +1,253 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+from db_instrumentation import InstrumentedCursor
+from prometheus_metrics import DB_CONNECT_DURATION
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became available within the acquisition timeout"""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection whose ``close()`` hands it back to its pool instead of disconnecting.
+
+    Existing ``conn = connect_db() ... conn.close()`` code therefore reuses
+    connections without changes.
+    """
+
+    pool = None
+    checked_out = False
+
+    def close(self):
+        if self.pool is None or self.closed:
+            super().close()
+        elif self.checked_out:
+            # Closing twice (common in except/finally paths) must not return it twice
+            self.checked_out = False
+            self.pool.putconn(self)
+
+    def disconnect(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool of PostgreSQL connections.
+
+    Holds between ``minconn`` and ``maxconn`` connections. ``getconn`` waits
+    at most ``timeout`` seconds for one to free up and then raises
+    PoolTimeoutError. Connections idle for longer than ``health_check_after``
+    seconds are checked with ``SELECT 1`` before being handed out, and
+    replaced if the check fails; returned connections are rolled back to a
+    clean, non-autocommit state with default session characteristics. Idle
+    connections above ``minconn`` are closed after ``max_idle`` seconds.
+    """
+
+    def __init__(self, db_config, minconn=None, maxconn=None, timeout=None, health_check_after=None,
+                 max_idle=None):
+        self.db_config = db_config
+        self.minconn = minconn if minconn is not None else int(os.getenv('DB_POOL_MIN', '2'))
+        self.maxconn = maxconn if maxconn is not None else int(os.getenv('DB_POOL_MAX', '20'))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', '5'))
+        self.health_check_after = health_check_after if health_check_after is not None else \
+            float(os.getenv('DB_POOL_HEALTH_CHECK_SECONDS', '30'))
+        self.max_idle = max_idle if max_idle is not None else float(os.getenv('DB_POOL_MAX_IDLE_SECONDS', '600'))
+        self.idle = deque()
+        self.size = 0
+        self.waiting = 0
+        self.counters = {'acquired': 0, 'created': 0, 'discarded': 0, 'timeouts': 0, 'wait_seconds': 0.0}
+        self.condition = threading.Condition()
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, cursor_factory=InstrumentedCursor,
+                                **self.db_config)
+        conn.pool = self
+        return conn
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        start = time.perf_counter()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            create = False
+            with self.condition:
+                while not self.idle and self.size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeoutError(f"No database connection available within {self.timeout:.1f}s "
+                                               f"({self.size}/{self.maxconn} in use)")
+                    self.waiting += 1
+                    try:
+                        self.condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+                if self.idle:
+                    conn, idle_since = self.idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    self.size += 1
+                    create = True
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self.condition:
+                    self.counters['created'] += 1
+            elif not self._healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            conn.checked_out = True
+            elapsed = time.perf_counter() - start
+            DB_CONNECT_DURATION.observe(elapsed)
+            with self.condition:
+                self.counters['acquired'] += 1
+                self.counters['wait_seconds'] += elapsed
+            return conn
+
+    def putconn(self, conn):
+        """Return ``conn`` to the pool, resetting its transaction state; broken connections are discarded"""
+        try:
+            if conn.closed:
+                raise psycopg2.InterfaceError("connection already closed")
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # Undo set_session(readonly=True, ...) and autocommit from the previous borrower (client-side only)
+            conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT', deferrable='DEFAULT', autocommit=False)
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        now = time.monotonic()
+        expired = []
+        with self.condition:
+            self.idle.append((conn, now))
+            # Shrink back towards minconn once a burst is over: drop the longest-idle connections
+            while len(self.idle) > self.minconn and now - self.idle[0][1] > self.max_idle:
+                expired.append(self.idle.popleft()[0])
+            self.size -= len(expired)
+            self.counters['discarded'] += len(expired)
+            self.condition.notify(len(expired) + 1)
+        for idle_conn in expired:
+            idle_conn.disconnect()
+
+    def _discard(self, conn):
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+        with self.condition:
+            self.counters['discarded'] += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self.condition:
+            idle = len(self.idle)
+            counters = dict(self.counters)
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self.size,
+                'idle': idle,
+                'in_use': self.size - idle,
+                'waiting': self.waiting,
+                'acquired': counters['acquired'],
+                'created': counters['created'],
+                'discarded': counters['discarded'],
+                'timeouts': counters['timeouts'],
+                'avg_acquire_ms': round(counters['wait_seconds'] / counters['acquired'] * 1000, 3)
+                if counters['acquired'] else 0.0
+            }
+
+    def closeall(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+            self.size -= len(idle)
+        for conn, _ in idle:
+            conn.disconnect()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def default_db_config():
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'database': os.getenv('DB_NAME', 'transaction_db'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'port': os.getenv('DB_PORT', '5432')
+    }
+
+
+def get_pool(db_config=None):
+    """The process-wide pool for ``db_config``, so the API, detector and network analyzer share connections"""
+    db_config = db_config or default_db_config()
+    key = tuple(sorted((name, str(value)) for name, value in db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_config)
+        return pool
+
+
+def connect(**db_config):
+    """Drop-in for ``psycopg2.connect``: a pooled connection, returned to the pool by ``close()``"""
+    return get_pool(db_config).getconn()
+
+
+def _abandon_pools_after_fork():
+    # A forked child must never close the parent's sockets (libpq would send Terminate on
+    # them), so the inherited pools are forgotten without disconnecting anything
+    global _pools, _pools_lock
+    _abandoned.extend(_pools.values())
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+_abandoned = []
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_abandon_pools_after_fork)
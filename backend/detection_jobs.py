@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from prometheus_metrics import DETECTION_JOB_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class JobAlreadyRunningError(Exception):
+    """Raised when a detection job is submitted while another one is still active"""
+
+    def __init__(self, job):
+        super().__init__(f"Detection job {job.id} is already {job.status}")
+        self.job = job
+
+
+class DetectionJob:
+    def __init__(self, mode, params):
+        self.id = str(uuid.uuid4())
+        self.mode = mode
+        self.params = params
+        self.status = 'queued'
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        # Detector whose progress/stage timings are reported while the job runs;
+        # both are copied onto the job when it finishes
+        self.detector = None
+        self.progress = None
+        self.stage_timings = {}
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def snapshot(self):
+        detector = self.detector
+        if detector is not None:
+            self.progress = dict(detector.progress)
+            self.stage_timings = dict(detector.stage_timings)
+
+    def to_dict(self):
+        if self.detector is not None:
+            self.snapshot()
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.now()) - self.started_at).total_seconds()
+        return {
+            "job_id": self.id,
+            "mode": self.mode,
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "progress": self.progress,
+            "stage_timings": {stage: round(seconds, 4) for stage, seconds in self.stage_timings.items()},
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class DetectionJobManager:
+    """Runs detection off the event loop, one job at a time, and keeps recent job history"""
+
+    def __init__(self, max_workers=1, history_size=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detection')
+        self.history_size = history_size
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, mode, params, run):
+        """Queue ``run(job)`` as a new job; raises JobAlreadyRunningError if one is active"""
+        with self.lock:
+            for job in self.jobs.values():
+                if job.active:
+                    raise JobAlreadyRunningError(job)
+            job = DetectionJob(mode, params)
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.history_size:
+                self.jobs.popitem(last=False)
+
+        self.executor.submit(self._run, job, run)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _run(self, job, run):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            job.result = run(job)
+            job.status = 'completed'
+            logger.info(f"Detection job {job.id} completed in {time.perf_counter() - start:.2f}s: {job.result}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            logger.error(f"Detection job {job.id} failed: {e}", exc_info=True)
+        finally:
+            job.snapshot()
+            job.detector = None
+            job.finished_at = datetime.now()
+            DETECTION_JOB_DURATION.observe(time.perf_counter() - start, job.mode, job.status)
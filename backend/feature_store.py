@@ -0,0 +1,224 @@
+import bisect
+import logging
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rolling windows, in seconds
+WINDOWS = {'1h': 3600, '24h': 86400, '7d': 604800}
+WIDEST_WINDOW = max(WINDOWS, key=WINDOWS.get)
+MAX_WINDOW = WINDOWS[WIDEST_WINDOW]
+# History kept per account: the largest window plus how late an out-of-order transaction may arrive
+RETENTION_SECONDS = MAX_WINDOW + int(os.getenv('FEATURE_STORE_MAX_LATENESS_SECONDS', '86400'))
+CHECKPOINT_FORMAT = 3
+
+ACCOUNT_FEATURES = (
+    [f'tx_count_{name}' for name in WINDOWS]
+    + [f'amount_sum_{name}' for name in WINDOWS]
+    + [f'amount_mean_{name}' for name in WINDOWS]
+    + [f'distinct_counterparties_{WIDEST_WINDOW}', 'seconds_since_last']
+)
+
+
+class AccountState:
+    """Per-event history of one account, with windows computed relative to the query time.
+
+    Events are kept sorted by timestamp together with a running prefix sum of
+    amounts, so a window's count and sum are two ``bisect`` lookups and a
+    subtraction: lookups never modify the state, and out-of-order events are
+    inserted in place instead of being dropped. Events older than the newest
+    one by more than ``RETENTION_SECONDS`` are pruned (in amortized batches);
+    ``ids`` guards against folding the same transaction in twice. Each event
+    keeps its counterparty, so distinct counterparties are counted over the
+    widest window too.
+    """
+
+    __slots__ = ('timestamps', 'amounts', 'cumulative', 'ids', 'seen', 'counterparties')
+
+    def __init__(self):
+        self.timestamps = []
+        self.amounts = []
+        # cumulative[i] is the sum of the first i amounts
+        self.cumulative = [0.0]
+        self.ids = []
+        self.seen = set()
+        self.counterparties = []
+
+    def add(self, timestamp, amount, counterparty, transaction_id):
+        """Insert one event; returns False for a duplicate id or an event older than the retention horizon"""
+        if transaction_id in self.seen:
+            return False
+        if self.timestamps and timestamp <= self.timestamps[-1] - RETENTION_SECONDS:
+            return False
+        position = bisect.bisect_right(self.timestamps, timestamp)
+        if position == len(self.timestamps):
+            self.timestamps.append(timestamp)
+            self.amounts.append(amount)
+            self.ids.append(transaction_id)
+            self.counterparties.append(counterparty)
+            self.cumulative.append(self.cumulative[-1] + amount)
+        else:
+            self.timestamps.insert(position, timestamp)
+            self.amounts.insert(position, amount)
+            self.ids.insert(position, transaction_id)
+            self.counterparties.insert(position, counterparty)
+            self.cumulative[position + 1:] = [total + amount for total in self.cumulative[position:]]
+        self.seen.add(transaction_id)
+        self.prune()
+        return True
+
+    def prune(self):
+        cut = bisect.bisect_right(self.timestamps, self.timestamps[-1] - RETENTION_SECONDS)
+        # Only once the expired prefix dominates the buffer, so pruning stays O(1) amortized
+        if cut > 64 and cut * 2 > len(self.timestamps):
+            self.seen.difference_update(self.ids[:cut])
+            del self.timestamps[:cut]
+            del self.amounts[:cut]
+            del self.ids[:cut]
+            del self.counterparties[:cut]
+            del self.cumulative[:cut]
+
+    def features(self, now):
+        """Features as of ``now`` from the events strictly before it; read-only"""
+        end = bisect.bisect_left(self.timestamps, now)
+        counts, sums = [], []
+        for window in WINDOWS.values():
+            start = bisect.bisect_right(self.timestamps, now - window, 0, end)
+            counts.append(end - start)
+            sums.append(self.cumulative[end] - self.cumulative[start])
+        means = [amount_sum / count if count else 0.0 for amount_sum, count in zip(sums, counts)]
+        widest = bisect.bisect_right(self.timestamps, now - MAX_WINDOW, 0, end)
+        counterparties = len(set(self.counterparties[widest:end]))
+        since_last = min(max(now - self.timestamps[end - 1], 0), MAX_WINDOW) if end else MAX_WINDOW
+        return counts + sums + means + [counterparties, since_last]
+
+
+EMPTY_FEATURES = AccountState().features(0)
+
+
+class AccountFeatureStore:
+    """In-memory per-account behavioural features with periodic checkpointing to disk.
+
+    ``process()`` returns point-in-time features for a batch (each row sees only
+    the transactions strictly before it) and folds the rows into the account
+    histories. Input need not be sorted; a transaction already in the store
+    (same id) is not added again, so replays and re-scoring are never double
+    counted. Lookups never change state.
+    """
+
+    def __init__(self, path=None, checkpoint_interval=None):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval if checkpoint_interval is not None else \
+            float(os.getenv('FEATURE_STORE_CHECKPOINT_SECONDS', '300'))
+        self.accounts = {}
+        self.high_water_mark = None
+        self.last_checkpoint = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def epoch_seconds(timestamps):
+        return pd.to_datetime(timestamps).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+    def lookup(self, account, timestamp):
+        """Feature vector for ``account`` as of ``timestamp`` (epoch seconds); O(log n), read-only"""
+        state = self.accounts.get(account)
+        return state.features(timestamp) if state is not None else list(EMPTY_FEATURES)
+
+    def lookup_many(self, accounts, timestamps):
+        """Thread-safe lookups for a handful of rows (inline scoring); never modifies the store"""
+        with self.lock:
+            return [self.lookup(account, timestamp) for account, timestamp in zip(accounts, timestamps)]
+
+    def update(self, account, counterparty, timestamp, amount, transaction_id):
+        state = self.accounts.get(account)
+        if state is None:
+            state = self.accounts[account] = AccountState()
+        if not state.add(timestamp, amount, counterparty, transaction_id):
+            return False
+        if self.high_water_mark is None or timestamp > self.high_water_mark:
+            self.high_water_mark = timestamp
+        return True
+
+    def process(self, df, update=True, return_added=False):
+        """Return ``ACCOUNT_FEATURES`` for each row of ``df`` (aligned with its index).
+
+        Rows without an ``id`` are looked up but never folded in, since they
+        could not be told apart from a replay. With ``return_added`` the result
+        is ``(features, added)``, ``added`` marking the rows folded in by this
+        call (not replays, not beyond the retention horizon).
+        """
+        timestamps = self.epoch_seconds(df['timestamp'])
+        accounts = df['from_account'].astype(str).to_numpy()
+        counterparties = df['to_account'].astype(str).to_numpy()
+        amounts = df['amount'].astype(float).to_numpy()
+        ids = df['id'].to_numpy() if 'id' in df else np.full(len(df), None, dtype=object)
+        order = np.argsort(timestamps, kind='stable')
+        features = np.empty((len(df), len(ACCOUNT_FEATURES)), dtype=np.float64)
+        added = np.zeros(len(df), dtype=bool)
+
+        with self.lock:
+            for position in order:
+                timestamp = int(timestamps[position])
+                features[position] = self.lookup(accounts[position], timestamp)
+                if update and ids[position] is not None and not pd.isna(ids[position]):
+                    added[position] = self.update(accounts[position], counterparties[position], timestamp,
+                                                  float(amounts[position]), str(ids[position]))
+
+        features = pd.DataFrame(features, columns=ACCOUNT_FEATURES, index=df.index)
+        return (features, added) if return_added else features
+
+    def checkpoint(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.lock:
+            payload = pickle.dumps({'format': CHECKPOINT_FORMAT, 'accounts': self.accounts,
+                                    'high_water_mark': self.high_water_mark},
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self.last_checkpoint = time.monotonic()
+        logger.info(f"Checkpointed feature store ({len(self.accounts)} accounts) to {path}")
+
+    def maybe_checkpoint(self):
+        if self.path and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    @classmethod
+    def load(cls, path=None):
+        """Restore the store from its last checkpoint, or start empty if there is none"""
+        path = path or os.getenv('FEATURE_STORE_PATH',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state', 'feature_store.pkl'))
+        store = cls(path=path)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+            if payload.get('format') != CHECKPOINT_FORMAT:
+                # Older checkpoints hold destructively-expired windows that cannot be converted
+                logger.warning(f"Ignoring feature store checkpoint {path} in an old format; starting empty")
+                return store
+            store.accounts = payload['accounts']
+            store.high_water_mark = payload['high_water_mark']
+            logger.info(f"Loaded feature store with {len(store.accounts)} accounts from {path}")
+        return store
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class InferenceScheduler:
+    """Coalesces concurrent scoring requests into micro-batches.
+
+    Requests are queued and a single dispatcher drains them into batches of at
+    most ``max_batch_size`` records, waiting at most ``max_wait_ms`` for the
+    batch to fill. The wait is adaptive: while recent batches hold a single
+    request (low concurrency) batches are dispatched immediately, so coalescing
+    only costs latency when there is something to coalesce. Each batch runs as
+    one vectorized ``score_fn(records)`` call on a dedicated inference thread.
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=2.0):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self.queue = None
+        self.dispatcher = None
+        # Request that did not fit in the previous batch; it starts the next one
+        self.carry = None
+        self.queued_records = 0
+        self.avg_requests_per_batch = 1.0
+        self.batches = 0
+        self.requests = 0
+        self.records = 0
+        self.queue_wait_seconds = 0.0
+        self.batch_size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram['+Inf'] = 0
+
+    def start(self):
+        if self.dispatcher is None:
+            self.queue = asyncio.Queue()
+            self.dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    async def stop(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.dispatcher = None
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, records):
+        """Score ``records`` (a list) as part of a micro-batch and return their results"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queued_records += len(records)
+        await self.queue.put((records, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        if self.carry is not None:
+            first, self.carry = self.carry, None
+        else:
+            first = await self.queue.get()
+        batch = [first]
+        size = len(first[0])
+        wait = self.max_wait_ms / 1000 if self.avg_requests_per_batch > 1.5 or not self.queue.empty() else 0.0
+        deadline = time.perf_counter() + wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0 and self.queue.empty():
+                break
+            try:
+                item = self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout)
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                self.carry = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, size
+
+    async def _dispatch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch, size = await self._collect()
+            dispatched_at = time.perf_counter()
+            self.queued_records -= size
+            self._observe(batch, size, dispatched_at)
+
+            records = [record for request_records, _, _ in batch for record in request_records]
+            try:
+                results = await loop.run_in_executor(self.executor, self.score_fn, records)
+            except Exception as e:
+                logger.error(f"Inference batch of {size} records failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_records, future, _ in batch:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(request_records)])
+                offset += len(request_records)
+
+    def _observe(self, batch, size, dispatched_at):
+        self.batches += 1
+        self.requests += len(batch)
+        self.records += size
+        self.queue_wait_seconds += sum(dispatched_at - enqueued_at for _, _, enqueued_at in batch)
+        self.avg_requests_per_batch = 0.9 * self.avg_requests_per_batch + 0.1 * len(batch)
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[bucket] += 1
+                break
+        else:
+            self.batch_size_histogram['+Inf'] += 1
+
+    def stats(self):
+        return {
+            "queue_depth": (self.queue.qsize() if self.queue is not None else 0) + (self.carry is not None),
+            "queued_records": self.queued_records,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "requests": self.requests,
+            "records": self.records,
+            "avg_batch_size": round(self.records / self.batches, 2) if self.batches else 0.0,
+            "avg_requests_per_batch": round(self.avg_requests_per_batch, 2),
+            "avg_queue_wait_ms": round(self.queue_wait_seconds / self.requests * 1000, 3) if self.requests else 0.0,
+            "batch_size_histogram": {str(bucket): count for bucket, count in self.batch_size_histogram.items()}
+        }
@@ -6,32 +6,42 @@ import plotly.graph_objects as go
 from dotenv import load_dotenv
 import os
 
+from snapshot_store import SnapshotStore
+from typed_frames import read_compact
+
 load_dotenv()
 
+ANALYTICS_COLUMNS = ['id', 'amount', 'transaction_type', 'timestamp', 'is_anomaly', 'anomaly_score',
+                     'from_account', 'to_account']
+
 class KaggleAnalytics:
-    def __init__(self, db_config):
+    def __init__(self, db_config, snapshot_store=None):
         self.db_config = {
             'host': os.getenv('DB_HOST', 'localhost'),
             'database': os.getenv('DB_NAME', 'transaction_db'),
             'user': os.getenv('DB_USER', 'postgres'),
             'password': os.getenv('DB_PASSWORD', 'Admin123')
         }
+        self.snapshot_store = snapshot_store or SnapshotStore.from_env()
     
     def connect_db(self):
         return psycopg2.connect(**self.db_config)
     
     def load_data(self, limit=10000):
+        if self.snapshot_store is not None:
+            return self.snapshot_store.read(ANALYTICS_COLUMNS, limit=limit)
         try:
             conn = self.connect_db()
             query = """
-                SELECT t.id, t.amount, t.transaction_type, t.timestamp, t.is_anomaly, t.anomaly_score,
+                SELECT t.id, t.amount::float8 as amount, t.transaction_type, t.timestamp, t.is_anomaly,
+                       t.anomaly_score::float8 as anomaly_score,
                        a1.account_number as from_account, a2.account_number as to_account
                 FROM transactions t
                 JOIN accounts a1 ON t.from_account_id = a1.id
                 JOIN accounts a2 ON t.to_account_id = a2.id
                 LIMIT %s
             """
-            df = pd.read_sql(query, conn, params=(limit,))
+            df = read_compact(query, conn, params=(limit,))
             conn.close()
             return df
         except Exception as e:
@@ -50,7 +60,7 @@ class KaggleAnalytics:
     
     def temporal_fraud_patterns(self, days=30):
         df = self.load_data()
-        df['date'] = pd.to_datetime(df['timestamp']).dt.date
+        df['date'] = df['timestamp'].dt.date
         df = df[df['timestamp'] >= datetime.now() - pd.Timedelta(days=days)]
         
         daily_fraud = df.groupby('date')['is_anomaly'].agg(['count', 'sum']).reset_index()
@@ -74,7 +84,7 @@ class KaggleAnalytics:
     
     def account_risk_analysis(self):
         df = self.load_data()
-        account_risk = df.groupby('from_account').agg({
+        account_risk = df.groupby('from_account', observed=True).agg({
             'is_anomaly': 'sum',
             'amount': 'mean',
             'anomaly_score': 'mean'
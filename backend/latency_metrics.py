@@ -0,0 +1,118 @@
+import bisect
+import math
+import threading
+import time
+
+# Log-spaced bucket upper bounds in seconds: 0.1ms up to ~17 minutes, 8 buckets per decade
+LATENCY_BUCKETS = tuple(10 ** (exponent / 8) for exponent in range(-32, 25))
+
+
+class RollingHistogram:
+    """Fixed-bucket latency histogram over a sliding time window.
+
+    The window is split into ``slots`` time slices, each with its own bucket
+    counts; a slice is cleared when the ring wraps around to it, so observing
+    and querying are O(buckets) regardless of traffic and old samples age out.
+    """
+
+    def __init__(self, window_seconds=3600, slots=60, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.slot_seconds = window_seconds / slots
+        self.counts = [[0] * (len(buckets) + 1) for _ in range(slots)]
+        self.sums = [0.0] * slots
+        self.epochs = [None] * slots
+
+    def _slot(self, now):
+        epoch = int(now // self.slot_seconds)
+        index = epoch % len(self.counts)
+        if self.epochs[index] != epoch:
+            self.counts[index] = [0] * (len(self.buckets) + 1)
+            self.sums[index] = 0.0
+            self.epochs[index] = epoch
+        return index
+
+    def observe(self, seconds, now=None):
+        index = self._slot(now if now is not None else time.time())
+        self.counts[index][bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sums[index] += seconds
+
+    def merged(self, now=None):
+        """Bucket counts and sum over the slices still inside the window"""
+        current = int((now if now is not None else time.time()) // self.slot_seconds)
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for index, epoch in enumerate(self.epochs):
+            if epoch is not None and current - epoch < len(self.counts):
+                counts = [a + b for a, b in zip(counts, self.counts[index])]
+                total += self.sums[index]
+        return counts, total
+
+    def quantile(self, q, counts):
+        """Estimate the ``q`` quantile from merged bucket ``counts``, interpolating inside the bucket"""
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self, now=None):
+        counts, total = self.merged(now)
+        count = sum(counts)
+        return {
+            'count': count,
+            'mean': total / count if count else None,
+            'p50': self.quantile(0.50, counts),
+            'p95': self.quantile(0.95, counts),
+            'p99': self.quantile(0.99, counts)
+        }
+
+
+class StageLatencyStore:
+    """Rolling latency histograms keyed by pipeline stage name, safe to feed from several threads"""
+
+    def __init__(self, window_seconds=3600, slots=60):
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window_seconds, self.slots)
+            histogram.observe(seconds)
+
+    def summary(self, stage):
+        """``count`` plus mean/p50/p95/p99 in milliseconds for ``stage`` (None when nothing was recorded)"""
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            stats = histogram.summary() if histogram is not None else {'count': 0}
+        return {
+            'count': stats['count'],
+            **{
+                f'{name}_ms': round(stats[name] * 1000, 3) if stats.get(name) is not None else None
+                for name in ('mean', 'p50', 'p95', 'p99')
+            }
+        }
+
+    def snapshot(self):
+        with self.lock:
+            stages = sorted(self.histograms)
+        return {stage: self.summary(stage) for stage in stages}
+
+    def p50_ms(self, *stages):
+        """Sum of the p50s of ``stages`` in milliseconds, 0.0 when none of them has samples"""
+        values = [self.summary(stage)['p50_ms'] for stage in stages]
+        return round(math.fsum(value for value in values if value is not None), 3)
+
+
+# Process-wide store the detector's timed stages and the API feed
+stage_latencies = StageLatencyStore()
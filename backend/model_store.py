@@ -0,0 +1,84 @@
+import json
+import os
+from datetime import datetime
+
+import joblib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ModelNotFoundError(Exception):
+    """Raised when scoring is requested before any model version has been trained"""
+
+
+class ModelStore:
+    """Versioned on-disk store for the fitted detector artifacts.
+
+    Each training run is written to its own ``<root>/<version>/`` directory and
+    the ``CURRENT`` file points at the version scoring should use.
+    """
+
+    ARTIFACTS_FILE = 'artifacts.joblib'
+    METADATA_FILE = 'metadata.json'
+    CURRENT_FILE = 'CURRENT'
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def list_versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, self.METADATA_FILE))
+        )
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, self.CURRENT_FILE), 'r') as f:
+                version = f.read().strip()
+            return version or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, artifacts, metadata):
+        """Persist a new version and make it current. Returns the version id."""
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        version_dir = self._version_dir(version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        joblib.dump(artifacts, os.path.join(version_dir, self.ARTIFACTS_FILE))
+        metadata = {**metadata, 'version': version, 'created_at': datetime.now().isoformat()}
+        with open(os.path.join(version_dir, self.METADATA_FILE), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        self.set_current(version)
+        return version
+
+    def set_current(self, version):
+        if version not in self.list_versions():
+            raise ModelNotFoundError(f"Model version {version} does not exist in {self.root}")
+        # Write-then-rename so readers never see a half-written pointer
+        tmp_path = os.path.join(self.root, self.CURRENT_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, self.CURRENT_FILE))
+
+    def load_metadata(self, version=None):
+        version = version or self.current_version()
+        if version is None:
+            raise ModelNotFoundError("No trained model available; run training first")
+        with open(os.path.join(self._version_dir(version), self.METADATA_FILE), 'r') as f:
+            return json.load(f)
+
+    def load(self, version=None):
+        """Load ``(artifacts, metadata)`` for a version, defaulting to the current one."""
+        version = version or self.current_version()
+        if version is None:
+            raise ModelNotFoundError("No trained model available; run training first")
+        artifacts = joblib.load(os.path.join(self._version_dir(version), self.ARTIFACTS_FILE))
+        return artifacts, self.load_metadata(version)
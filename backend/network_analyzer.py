@@ -1,12 +1,13 @@
 import networkx as nx
 import pandas as pd
-import psycopg2
 from datetime import datetime
 from typing import Dict, List
 import os
 from dotenv import load_dotenv
 import logging
 
+from db_pool import connect as db_connect
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,7 +28,7 @@ class NetworkAnalyzer:
 
     def connect_db(self):
         try:
-            return psycopg2.connect(**self.db_config)
+            return db_connect(**self.db_config)
         except Exception as e:
             logger.error(f"Database connection error: {str(e)}")
             raise
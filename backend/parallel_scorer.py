@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Per-process detector, created once by the pool initializer
+_worker_detector = None
+
+# Workers must not be forked from the API process, which runs several threads (a fork copies
+# locks held by other threads); forkserver starts them from a clean single-threaded server
+START_METHOD = os.getenv('PARALLEL_START_METHOD',
+                         'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def _init_worker(model_dir, version):
+    global _worker_detector
+    from anomaly_detector import TransactionAnomalyDetector
+    from model_store import ModelStore
+
+    _worker_detector = TransactionAnomalyDetector(None, model_store=ModelStore(model_dir))
+    _worker_detector.load_models(version)
+
+
+def _score_partition(df):
+    return _worker_detector.score_models(df)
+
+
+class ParallelScorer:
+    """Score large batches across a process pool.
+
+    Every worker loads the fitted models from the model store once, in the pool
+    initializer, given only the store's directory and the version; after that
+    only the partition DataFrames and their scores cross process boundaries.
+    Workers are started with ``START_METHOD`` rather than forked.
+    """
+
+    def __init__(self, model_store, version, workers=None, partition_by='account'):
+        self.model_store = model_store
+        self.version = version
+        self.workers = workers or int(os.getenv('DETECTION_WORKERS', os.cpu_count() or 1))
+        self.partition_by = partition_by
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(START_METHOD),
+                initializer=_init_worker,
+                initargs=(self.model_store.root, self.version)
+            )
+        return self
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def partition(self, df, partitions):
+        """Split ``df`` into row-position arrays, by account hash or by contiguous time range"""
+        if self.partition_by == 'time':
+            order = np.argsort(pd.to_datetime(df['timestamp']).to_numpy(), kind='stable')
+            return [part for part in np.array_split(order, partitions) if len(part)]
+
+        buckets = pd.util.hash_pandas_object(df['from_account'], index=False).to_numpy() % partitions
+        return [np.flatnonzero(buckets == bucket) for bucket in range(partitions) if (buckets == bucket).any()]
+
+    def score(self, df):
+        """Score ``df`` in parallel and return the component scores in the original row order"""
+        self.start()
+        positions = self.partition(df, self.workers)
+        results = self.executor.map(_score_partition, [df.iloc[part] for part in positions])
+
+        merged = pd.concat(list(results), ignore_index=True)
+        order = np.empty(len(df), dtype=np.int64)
+        order[np.concatenate(positions)] = np.arange(len(df))
+        return merged.iloc[order].reset_index(drop=True)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Monthly partition maintenance and retention for the partitioned ``transactions`` table
+(01-create-database-partitioned.sql).
+
+Meant to run on a schedule (cron, systemd timer, ...), e.g.:
+
+    python partition_manager.py create --months-ahead 3
+    python partition_manager.py retention --keep-months 12 --archive-dir archive/
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import re
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+from counters import subtract_table
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'transactions'
+DEFAULT_PARTITION = 'transactions_default'
+PARTITION_NAME = re.compile(r'^transactions_y(\d{4})m(\d{2})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_start(timestamp):
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def partition_name(month):
+    return f'transactions_y{month.year:04d}m{month.month:02d}'
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')", (PARENT_TABLE,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(cursor):
+    """Monthly partitions currently attached to ``transactions``, as ``{month_start: name}``"""
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (PARENT_TABLE,))
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_partition(cursor, month):
+    """Create the partition for ``month``, moving any of its rows out of the default partition first.
+
+    A range cannot be attached while the default partition holds rows in it, so
+    the partition is built as a plain table, filled from the default partition
+    and then attached.
+    """
+    start, end = month, add_months(month, 1)
+    name = sql.Identifier(partition_name(month))
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+        name, sql.Identifier(PARENT_TABLE)))
+    cursor.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {default} WHERE timestamp >= %s AND timestamp < %s RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM moved
+    """).format(default=sql.Identifier(DEFAULT_PARTITION), partition=name), (start, end))
+    moved = cursor.rowcount
+    cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(PARENT_TABLE), name), (start, end))
+    logger.info(f"Created partition {partition_name(month)} ({moved} rows moved from the default partition)")
+    return moved
+
+
+def ensure_partitions(cursor, months_ahead=3, now=None):
+    """Create partitions for the current month and ``months_ahead`` more, plus every month in the default partition.
+
+    Returns the names of the partitions created.
+    """
+    existing = list_partitions(cursor)
+    current = month_start(now or datetime.now())
+    wanted = {add_months(current, offset) for offset in range(months_ahead + 1)}
+    cursor.execute(sql.SQL("SELECT DISTINCT date_trunc('month', timestamp) FROM {}").format(
+        sql.Identifier(DEFAULT_PARTITION)))
+    wanted.update(month_start(row[0]) for row in cursor.fetchall() if row[0] is not None)
+
+    created = []
+    for month in sorted(wanted - set(existing)):
+        create_partition(cursor, month)
+        created.append(partition_name(month))
+    return created
+
+
+def copy_to_gzip(cursor, query, path):
+    """``COPY (query) TO STDOUT`` as CSV with a header, gzip-compressed into ``path`` (written atomically)"""
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wb') as f:
+        statement = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(query)
+        cursor.copy_expert(statement.as_string(cursor), f)
+    os.replace(tmp_path, path)
+
+
+def archive_partition(conn, month, archive_dir, keep_detached=False):
+    """Archive one month to ``archive_dir`` and remove it from ``transactions``.
+
+    The partition's rows and their ``anomaly_detections`` are exported with COPY
+    to gzip'd CSV files first; only once both files are on disk is the
+    partition detached (and dropped, unless ``keep_detached``), its
+    detections deleted and its rows taken out of the counters, in a single
+    transaction.
+    """
+    name = partition_name(month)
+    partition = sql.Identifier(name)
+    os.makedirs(archive_dir, exist_ok=True)
+    transactions_path = os.path.join(archive_dir, f'{name}.csv.gz')
+    detections_path = os.path.join(archive_dir, f'anomaly_detections_{name[len(PARENT_TABLE) + 1:]}.csv.gz')
+    detections = sql.SQL("SELECT * FROM anomaly_detections WHERE transaction_id IN (SELECT id FROM {})").format(
+        partition)
+
+    cursor = conn.cursor()
+    try:
+        copy_to_gzip(cursor, sql.SQL("SELECT * FROM {}").format(partition), transactions_path)
+        copy_to_gzip(cursor, detections, detections_path)
+        cursor.execute(sql.SQL("DELETE FROM anomaly_detections WHERE transaction_id IN (SELECT id FROM {})").format(
+            partition))
+        subtract_table(cursor, name)
+        cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(PARENT_TABLE), partition))
+        if not keep_detached:
+            cursor.execute(sql.SQL("DROP TABLE {}").format(partition))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    logger.info(f"Archived partition {name} to {transactions_path}")
+    return transactions_path
+
+
+def apply_retention(conn, keep_months=12, archive_dir='archive', keep_detached=False, now=None):
+    """Archive every monthly partition that ends before the retention window; returns the archive paths"""
+    cutoff = add_months(month_start(now or datetime.now()), -keep_months)
+    cursor = conn.cursor()
+    expired = [month for month in list_partitions(cursor) if add_months(month, 1) <= cutoff]
+    cursor.close()
+    conn.commit()
+    return [archive_partition(conn, month, archive_dir, keep_detached) for month in expired]
+
+
+def connect_db():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'transaction_db'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', ''),
+        port=os.getenv('DB_PORT', '5432')
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain monthly transactions partitions")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    create = subparsers.add_parser('create', help="Create upcoming partitions and split the default partition")
+    create.add_argument('--months-ahead', type=int, default=3)
+    retention = subparsers.add_parser('retention', help="Archive and detach partitions older than the window")
+    retention.add_argument('--keep-months', type=int, default=12)
+    retention.add_argument('--archive-dir', default=os.getenv('ARCHIVE_DIR', 'archive'))
+    retention.add_argument('--keep-detached', action='store_true',
+                           help="Leave detached partitions in place as standalone tables instead of dropping them")
+    args = parser.parse_args()
+
+    conn = connect_db()
+    try:
+        cursor = conn.cursor()
+        if not is_partitioned(cursor):
+            parser.error("transactions is not a partitioned table (see 01-create-database-partitioned.sql)")
+        if args.command == 'create':
+            created = ensure_partitions(cursor, args.months_ahead)
+            conn.commit()
+            print(f"Created {len(created)} partition(s): {', '.join(created) or 'none'}")
+        else:
+            archived = apply_retention(conn, args.keep_months, args.archive_dir, args.keep_detached)
+            print(f"Archived {len(archived)} partition(s) to {args.archive_dir}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
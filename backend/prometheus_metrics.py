@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; request/query latencies cluster well below a second
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Base for labelled metrics; one value slot per tuple of label values.
+
+    Updates take a per-metric lock held for a dict lookup and an add, which
+    keeps the per-request cost in the low microseconds.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in sorted(items):
+            lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts plus +Inf, then the sum
+                state = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = [(labels, list(state)) for labels, state in self.values.items()]
+        for labels, state in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(state[-1])}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests by route template, method and status code.',
+    ('method', 'route', 'status')))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template and method.',
+    ('method', 'route')))
+DB_CONNECT_DURATION = REGISTRY.register(Histogram(
+    'db_connection_acquire_seconds', 'Time to obtain a PostgreSQL connection.'))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'PostgreSQL statement execution time by statement type.',
+    ('operation',)))
+WEBSOCKET_CLIENTS = REGISTRY.register(Gauge(
+    'websocket_clients', 'Currently connected WebSocket clients by route.', ('route',)))
+WEBSOCKET_MESSAGES = REGISTRY.register(Counter(
+    'websocket_messages_total', 'WebSocket messages by route and direction (sent/received).',
+    ('route', 'direction')))
+DETECTION_JOB_DURATION = REGISTRY.register(Histogram(
+    'detection_job_duration_seconds', 'Background detection job run time by mode and final status.',
+    ('mode', 'status'), buckets=JOB_BUCKETS))
+
+
+def route_label(scope):
+    """Route template (``/api/detect/{job_id}``) rather than the raw path, to keep label cardinality bounded"""
+    route = scope.get('route')
+    return getattr(route, 'path', None) or 'unmatched'
+
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware recording request counts/latency and WebSocket activity.
+
+    It wraps ``send``/``receive`` without buffering bodies or creating
+    Request objects, so the added cost is a couple of clock reads and metric
+    updates per request (a few microseconds).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _http(self, scope, receive, send):
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_label(scope)
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, scope['method'], route)
+            HTTP_REQUESTS.inc(scope['method'], route, str(status[0]))
+
+    async def _websocket(self, scope, receive, send):
+        route = scope.get('path', 'unmatched')
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'websocket.receive':
+                WEBSOCKET_MESSAGES.inc(route, 'received')
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'websocket.send':
+                WEBSOCKET_MESSAGES.inc(route, 'sent')
+            await send(message)
+
+        WEBSOCKET_CLIENTS.inc(route)
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            WEBSOCKET_CLIENTS.dec(route)
@@ -0,0 +1,68 @@
+import logging
+import time
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REASONS = ['High amount', 'Unusual pattern']
+# transactions.anomaly_score and anomaly_detections.anomaly_score are DECIMAL(5,2)
+MAX_STORED_SCORE = 999.99
+
+
+class AnomalyResultWriter:
+    """Set-based write-back of detection results.
+
+    All flagged transactions of a batch are written with one
+    ``UPDATE ... FROM (VALUES ...)`` and one multi-row ``INSERT`` (paged by
+    ``page_size``) instead of two statements per row.
+    """
+
+    def __init__(self, page_size=5000):
+        self.page_size = page_size
+        self.last_stats = {'rows': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+
+    def write(self, cursor, ids, scores, reasons=None, detection_method='ensemble', confidence=0.95):
+        """Persist flagged transactions; the caller owns the database transaction.
+
+        ``ids`` and ``scores`` are parallel sequences, ``reasons`` is either a
+        parallel sequence of reason lists or None for the default reasons.
+        """
+        start = time.perf_counter()
+        detection_time = datetime.now()
+        ids = [str(transaction_id) for transaction_id in ids]
+        scores = [min(max(float(score), -MAX_STORED_SCORE), MAX_STORED_SCORE) for score in scores]
+        if reasons is None:
+            reasons = [DEFAULT_REASONS] * len(ids)
+
+        if ids:
+            execute_values(cursor, """
+                UPDATE transactions AS t
+                SET is_anomaly = TRUE,
+                    anomaly_score = v.anomaly_score,
+                    anomaly_reasons = v.anomaly_reasons,
+                    detection_time = v.detection_time
+                FROM (VALUES %s) AS v(id, anomaly_score, anomaly_reasons, detection_time)
+                WHERE t.id = v.id
+            """, [
+                (transaction_id, score, list(reason), detection_time)
+                for transaction_id, score, reason in zip(ids, scores, reasons)
+            ], template="(%s::uuid, %s::numeric, %s::text[], %s::timestamp)", page_size=self.page_size)
+
+            execute_values(cursor, """
+                INSERT INTO anomaly_detections (transaction_id, detection_method, anomaly_score, confidence, detected_at)
+                VALUES %s
+            """, [
+                (transaction_id, detection_method, score, confidence, detection_time)
+                for transaction_id, score in zip(ids, scores)
+            ], template="(%s::uuid, %s, %s, %s, %s)", page_size=self.page_size)
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            'rows': len(ids),
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(len(ids) / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        logger.info(f"Wrote {len(ids)} detection results in {elapsed:.3f}s ({self.last_stats['rows_per_sec']} rows/sec)")
+        return self.last_stats
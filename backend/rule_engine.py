@@ -0,0 +1,254 @@
+import json
+import logging
+import operator
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda series, value: series.isin(value),
+    'not_in': lambda series, value: ~series.isin(value),
+    'between': lambda series, value: (series >= value[0]) & (series <= value[1])
+}
+
+WINDOW_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def empty_rule_stats():
+    return {'hits': 0, 'rows': 0, 'evaluations': 0, 'errors': 0, 'seconds': 0.0}
+
+
+def parse_window(window):
+    """Window length in seconds from an int or a string such as ``'10m'`` or ``'1h'``"""
+    if isinstance(window, (int, float)):
+        return int(window)
+    return int(float(window[:-1]) * WINDOW_UNITS[window[-1]])
+
+
+def derived_column(df, field):
+    """Rule fields that are not stored columns but derived from ``timestamp``"""
+    if field == 'hour':
+        return pd.to_datetime(df['timestamp']).dt.hour
+    if field == 'day_of_week':
+        return pd.to_datetime(df['timestamp']).dt.dayofweek
+    raise KeyError(field)
+
+
+def compile_condition(rule_name, condition):
+    field, op, value = condition['field'], condition['op'], condition['value']
+    if op not in OPERATORS:
+        raise ValueError(f"Rule {rule_name}: unknown operator {op!r}")
+    if op == 'between' and len(value) != 2:
+        raise ValueError(f"Rule {rule_name}: 'between' needs [low, high]")
+    compare = OPERATORS[op]
+
+    def mask(df, context):
+        column = df[field] if field in df else derived_column(df, field)
+        # A copy: with copy-on-write, asarray would be a read-only view of the pandas result
+        return np.array(compare(column, value), dtype=bool)
+
+    return mask
+
+
+def compile_velocity(rule_name, spec):
+    """More than ``count`` matching transactions from one account within ``window``.
+
+    With ``new_counterparties`` only transfers to a counterparty the account had
+    not paid before count. Evaluated for the whole batch at once: rows are
+    sorted by (account, time), matching rows are prefix-summed, and each row's
+    window start is found with one ``searchsorted``.
+    """
+    window = parse_window(spec.get('window', '10m'))
+    threshold = int(spec['count'])
+    types = spec.get('transaction_type')
+    if isinstance(types, str):
+        types = [types]
+    new_only = bool(spec.get('new_counterparties', False))
+    if window <= 0 or threshold < 0:
+        raise ValueError(f"Rule {rule_name}: velocity window and count must be positive")
+
+    def mask(df, context):
+        n = len(df)
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+        accounts = pd.factorize(df['from_account'].astype(str))[0].astype(np.int64)
+        seconds = pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[s]').astype(np.int64)
+        seconds = seconds - seconds.min()
+        eligible = np.ones(n, dtype=bool)
+        if types:
+            eligible &= df['transaction_type'].isin(types).to_numpy(dtype=bool)
+        if new_only:
+            eligible &= context['new_counterparty']
+
+        # One sortable int64 key per row: account-major, time-minor
+        span = int(seconds.max()) + window + 1
+        keys = accounts * span + seconds
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        counts = np.cumsum(eligible[order])
+        starts = np.searchsorted(sorted_keys, sorted_keys - window + 1, side='left')
+        in_window = counts - np.where(starts > 0, counts[np.maximum(starts - 1, 0)], 0)
+
+        hits = np.zeros(n, dtype=bool)
+        hits[order] = (in_window > threshold) & eligible[order]
+        return hits
+
+    return mask
+
+
+class CompiledRule:
+    def __init__(self, definition):
+        self.name = definition['name']
+        self.description = definition.get('description', '')
+        self.score = float(definition.get('score', 100))
+        self.enabled = definition.get('enabled', True)
+        self.masks = [compile_condition(self.name, condition) for condition in definition.get('when', [])]
+        if 'velocity' in definition:
+            self.masks.append(compile_velocity(self.name, definition['velocity']))
+        if not self.masks:
+            raise ValueError(f"Rule {self.name}: needs 'when' conditions or a 'velocity' clause")
+
+    def evaluate(self, df, context):
+        mask = self.masks[0](df, context)
+        for condition in self.masks[1:]:
+            if not mask.any():
+                break
+            mask = mask & condition(df, context)
+        return mask
+
+
+class RuleEngine:
+    """Declarative detection rules compiled to NumPy masks and evaluated per batch.
+
+    Rules are read from a JSON file (``RULES_PATH``, default ``backend/rules.json``)
+    and recompiled whenever its modification time changes; a file that fails
+    to compile is logged and the previous rule set stays active. Per-rule hit
+    counts and evaluation time are kept for ``stats()``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('RULES_PATH',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+        self.rules = []
+        self.mtime = None
+        self.loaded_at = None
+        self.load_error = None
+        self.rule_stats = {}
+        self.lock = threading.Lock()
+
+    def maybe_reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime:
+            return False
+        with self.lock:
+            if mtime == self.mtime:
+                return False
+            try:
+                rules = []
+                if mtime is not None:
+                    with open(self.path, 'r') as f:
+                        definitions = json.load(f).get('rules', [])
+                    rules = [CompiledRule(definition) for definition in definitions]
+            except Exception as e:
+                self.load_error = str(e)
+                self.mtime = mtime
+                logger.error(f"Failed to load rules from {self.path}, keeping the previous rule set: {e}")
+                return False
+            self.rules = rules
+            self.mtime = mtime
+            self.loaded_at = time.time()
+            self.load_error = None
+            for rule in rules:
+                self.rule_stats.setdefault(rule.name, empty_rule_stats())
+            logger.info(f"Loaded {len(rules)} detection rules from {self.path}")
+            return True
+
+    def evaluate(self, df, new_counterparty=None):
+        """Evaluate all enabled rules over ``df``.
+
+        ``new_counterparty`` optionally marks rows whose (from, to) pair has no
+        history before this batch; by default a pair is new at its first
+        occurrence in ``df``. Returns a frame aligned with ``df`` holding
+        ``rule_score`` (highest score among the rules hit), ``rule_hits`` (rule
+        names) and ``rule_based`` (any rule hit).
+        """
+        self.maybe_reload()
+        rules = [rule for rule in self.rules if rule.enabled]
+        n = len(df)
+        if new_counterparty is None and n:
+            new_counterparty = ~df[['from_account', 'to_account']].astype(str).duplicated().to_numpy()
+        context = {'new_counterparty': new_counterparty}
+
+        rule_score = np.zeros(n, dtype=float)
+        hit_matrix = np.zeros((n, len(rules)), dtype=bool)
+        for i, rule in enumerate(rules):
+            start = time.perf_counter()
+            error = False
+            try:
+                hit_matrix[:, i] = rule.evaluate(df, context)
+            except Exception as e:
+                error = True
+                logger.error(f"Rule {rule.name} failed: {e}")
+            elapsed = time.perf_counter() - start
+            rule_score = np.where(hit_matrix[:, i], np.maximum(rule_score, rule.score), rule_score)
+            with self.lock:
+                stats = self.rule_stats.setdefault(rule.name, empty_rule_stats())
+                stats['hits'] += int(hit_matrix[:, i].sum())
+                stats['rows'] += n
+                stats['evaluations'] += 1
+                stats['errors'] += int(error)
+                stats['seconds'] += elapsed
+
+        # Reasons are only materialized for the (few) rows that hit something
+        rule_based = hit_matrix.any(axis=1)
+        rule_hits = np.full(n, None, dtype=object)
+        for row in np.flatnonzero(rule_based):
+            rule_hits[row] = [rule.name for rule, hit in zip(rules, hit_matrix[row]) if hit]
+        return pd.DataFrame({
+            'rule_score': rule_score,
+            'rule_hits': rule_hits,
+            'rule_based': rule_based
+        }, index=df.index)
+
+    def stats(self):
+        self.maybe_reload()
+        with self.lock:
+            rule_stats = {name: dict(values) for name, values in self.rule_stats.items()}
+            rules = list(self.rules)
+        report = []
+        for rule in rules:
+            stats = rule_stats.get(rule.name, empty_rule_stats())
+            report.append({
+                'name': rule.name,
+                'description': rule.description,
+                'score': rule.score,
+                'enabled': rule.enabled,
+                'hits': stats['hits'],
+                'rows': stats['rows'],
+                'evaluations': stats['evaluations'],
+                'errors': stats['errors'],
+                'total_ms': round(stats['seconds'] * 1000, 3),
+                'mean_ms': round(stats['seconds'] / stats['evaluations'] * 1000, 3) if stats['evaluations'] else 0.0
+            })
+        return {'path': self.path, 'loaded_at': self.loaded_at, 'load_error': self.load_error, 'rules': report}
+
+
+# Process-wide engine shared by the detector and the API
+rule_engine = RuleEngine()
@@ -3,6 +3,7 @@ import zipfile
 import requests
 import psycopg2
 from kaggle_data_loader import KaggleDataLoader
+from partition_manager import ensure_partitions
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,7 +23,7 @@ class KaggleDataSetup:
     def connect_db(self):
         return psycopg2.connect(**self.db_config)
     
-    def setup_database(self):
+    def setup_database(self, partitioned=False):
         try:
             conn = self.connect_db()
             cursor = conn.cursor()
@@ -35,32 +36,57 @@ class KaggleDataSetup:
                 )
             """)
             
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id SERIAL PRIMARY KEY,
-                    from_account_id INTEGER REFERENCES accounts(id),
-                    to_account_id INTEGER REFERENCES accounts(id),
-                    amount DECIMAL(15,2),
-                    transaction_type VARCHAR(20),
-                    timestamp TIMESTAMP,
-                    description TEXT,
-                    is_anomaly BOOLEAN,
-                    anomaly_score DECIMAL(5,2),
-                    anomaly_reasons TEXT[],
-                    status VARCHAR(20) DEFAULT 'pending'
-                )
-            """)
+            if partitioned:
+                # Monthly range partitions on timestamp: the partition key has to be part of the
+                # primary key, and anomaly_detections cannot reference transactions(id) alone
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS transactions (
+                        id SERIAL,
+                        from_account_id INTEGER REFERENCES accounts(id),
+                        to_account_id INTEGER REFERENCES accounts(id),
+                        amount DECIMAL(15,2),
+                        transaction_type VARCHAR(20),
+                        timestamp TIMESTAMP NOT NULL,
+                        description TEXT,
+                        is_anomaly BOOLEAN,
+                        anomaly_score DECIMAL(5,2),
+                        anomaly_reasons TEXT[],
+                        status VARCHAR(20) DEFAULT 'pending',
+                        PRIMARY KEY (id, timestamp)
+                    ) PARTITION BY RANGE (timestamp)
+                """)
+                cursor.execute("CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT")
+                transaction_reference = "INTEGER NOT NULL"
+            else:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS transactions (
+                        id SERIAL PRIMARY KEY,
+                        from_account_id INTEGER REFERENCES accounts(id),
+                        to_account_id INTEGER REFERENCES accounts(id),
+                        amount DECIMAL(15,2),
+                        transaction_type VARCHAR(20),
+                        timestamp TIMESTAMP,
+                        description TEXT,
+                        is_anomaly BOOLEAN,
+                        anomaly_score DECIMAL(5,2),
+                        anomaly_reasons TEXT[],
+                        status VARCHAR(20) DEFAULT 'pending'
+                    )
+                """)
+                transaction_reference = "INTEGER REFERENCES transactions(id)"
             
-            cursor.execute("""
+            cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS anomaly_detections (
                     id SERIAL PRIMARY KEY,
-                    transaction_id INTEGER REFERENCES transactions(id),
+                    transaction_id {transaction_reference},
                     detection_method VARCHAR(50),
                     anomaly_score DECIMAL(5,2),
                     confidence DECIMAL(5,2),
                     detection_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            if partitioned:
+                ensure_partitions(cursor)
             
             conn.commit()
             print("Database schema created successfully!")
@@ -92,7 +118,21 @@ class KaggleDataSetup:
         self.loader.load_kaggle_data(file_path)
         print("Data loaded successfully into database!")
     
-    def setup(self, dataset='ieee-fraud-detection', file_name='train_transaction.csv.zip'):
-        self.setup_database()
+    def split_default_partition(self):
+        """Move loaded rows that landed in the default partition into their monthly partitions"""
+        conn = self.connect_db()
+        try:
+            cursor = conn.cursor()
+            created = ensure_partitions(cursor)
+            conn.commit()
+            cursor.close()
+            print(f"Created {len(created)} monthly partition(s)")
+        finally:
+            conn.close()
+    
+    def setup(self, dataset='ieee-fraud-detection', file_name='train_transaction.csv.zip', partitioned=False):
+        self.setup_database(partitioned=partitioned)
         file_path = self.download_kaggle_dataset(dataset, file_name)
-        self.load_data(file_path)
\ No newline at end of file
+        self.load_data(file_path)
+        if partitioned:
+            self.split_default_partition()
\ No newline at end of file
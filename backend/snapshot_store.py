@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot of the joined transactions view, for training and analytics reads.
+
+The view is exported to one Parquet file per calendar month under
+``SNAPSHOT_DIR`` and refreshed incrementally: only months that received new
+transactions or new detection results since the last refresh are rewritten.
+With ``DATA_SOURCE=snapshot`` the detector's training/sample loads and
+``KaggleAnalytics`` read these files (memory-mapped) instead of PostgreSQL, e.g.:
+
+    python snapshot_store.py refresh
+    python snapshot_store.py refresh --full
+    python snapshot_store.py info
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from typed_frames import CATEGORICAL_COLUMNS, compact_transactions
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('amount', pa.float64()),
+    ('transaction_type', pa.string()),
+    ('timestamp', pa.timestamp('us')),
+    ('is_anomaly', pa.bool_()),
+    ('anomaly_score', pa.float64()),
+    ('from_account_id', pa.string()),
+    ('to_account_id', pa.string()),
+    ('from_account', pa.string()),
+    ('to_account', pa.string())
+])
+
+EXPORT_QUERY = """
+    SELECT t.id::text as id, t.amount::float8 as amount, t.transaction_type, t.timestamp,
+           COALESCE(t.is_anomaly, false) as is_anomaly, t.anomaly_score::float8 as anomaly_score,
+           t.from_account_id::text as from_account_id, t.to_account_id::text as to_account_id,
+           a1.account_number as from_account, a2.account_number as to_account
+    FROM transactions t
+    JOIN accounts a1 ON t.from_account_id = a1.id
+    JOIN accounts a2 ON t.to_account_id = a2.id
+    WHERE t.timestamp >= %s AND t.timestamp < %s
+    ORDER BY t.timestamp, t.id
+"""
+
+
+class SnapshotNotFoundError(Exception):
+    """Raised when snapshot reads are requested before the first refresh"""
+
+
+def month_key(timestamp):
+    return timestamp.strftime('%Y-%m')
+
+
+def month_bounds(key):
+    start = datetime.strptime(key, '%Y-%m')
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+class SnapshotStore:
+    """Month-partitioned Parquet export of the transactions view plus a JSON manifest.
+
+    The manifest records each partition's row count and the refresh watermark:
+    the newest transaction timestamp and detection time seen. A month is
+    rewritten whole when anything in it changes, so a refresh that races with
+    ingest or detection is simply repeated by the next one.
+    """
+
+    MANIFEST_FILE = 'manifest.json'
+    PARTITION_FILE = 'transactions.parquet'
+
+    def __init__(self, root=None, db_config=None, chunk_size=100000):
+        self.root = root or os.getenv('SNAPSHOT_DIR',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+        self.db_config = db_config or {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'database': os.getenv('DB_NAME', 'transaction_db'),
+            'user': os.getenv('DB_USER', 'postgres'),
+            'password': os.getenv('DB_PASSWORD', ''),
+            'port': os.getenv('DB_PORT', '5432')
+        }
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_env(cls):
+        """A store when ``DATA_SOURCE=snapshot``, otherwise None (read from PostgreSQL)"""
+        return cls() if os.getenv('DATA_SOURCE', 'postgres') == 'snapshot' else None
+
+    def _manifest_path(self):
+        return os.path.join(self.root, self.MANIFEST_FILE)
+
+    def _partition_path(self, key):
+        return os.path.join(self.root, f'month={key}', self.PARTITION_FILE)
+
+    def load_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def changed_months(self, cursor, manifest):
+        """Months holding transactions or detection results newer than the manifest watermark"""
+        if manifest is None or manifest.get('last_timestamp') is None:
+            cursor.execute("""
+                SELECT DISTINCT date_trunc('month', timestamp) FROM transactions
+                WHERE timestamp IS NOT NULL
+            """)
+        else:
+            cursor.execute("""
+                SELECT DISTINCT date_trunc('month', timestamp) FROM transactions
+                WHERE timestamp > %s
+                   OR (detection_time IS NOT NULL AND detection_time > COALESCE(%s::timestamp, '-infinity'))
+            """, (manifest['last_timestamp'], manifest.get('last_detection_time')))
+        return sorted(month_key(row[0]) for row in cursor.fetchall() if row[0] is not None)
+
+    def export_month(self, conn, key):
+        """Rewrite one month's partition from PostgreSQL; returns its row count"""
+        start, end = month_bounds(key)
+        path = self._partition_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        rows = 0
+        cursor = conn.cursor(name=f'snapshot_{key.replace("-", "_")}')
+        cursor.itersize = self.chunk_size
+        try:
+            cursor.execute(EXPORT_QUERY, (start, end))
+            with pq.ParquetWriter(tmp_path, SNAPSHOT_SCHEMA, compression='zstd') as writer:
+                while True:
+                    batch = cursor.fetchmany(self.chunk_size)
+                    if not batch:
+                        break
+                    chunk = pd.DataFrame(batch, columns=SNAPSHOT_SCHEMA.names)
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=SNAPSHOT_SCHEMA, preserve_index=False))
+                    rows += len(batch)
+        finally:
+            cursor.close()
+        os.replace(tmp_path, path)
+        return rows
+
+    def refresh(self, full=False):
+        """Bring the snapshot up to date with PostgreSQL; returns the months rewritten"""
+        manifest = None if full else self.load_manifest()
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            # A repeatable-read snapshot keeps the watermark and the exported rows consistent
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(timestamp), MAX(detection_time) FROM transactions")
+            last_timestamp, last_detection_time = cursor.fetchone()
+            months = self.changed_months(cursor, manifest)
+            cursor.close()
+
+            partitions = dict(manifest['partitions']) if manifest else {}
+            for key in months:
+                partitions[key] = {'rows': self.export_month(conn, key), 'refreshed_at': datetime.now().isoformat()}
+                logger.info(f"Exported snapshot partition {key} ({partitions[key]['rows']} rows)")
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._write_manifest({
+            'last_timestamp': last_timestamp.isoformat() if last_timestamp else None,
+            'last_detection_time': last_detection_time.isoformat() if last_detection_time else None,
+            'refreshed_at': datetime.now().isoformat(),
+            'rows': sum(partition['rows'] for partition in partitions.values()),
+            'partitions': dict(sorted(partitions.items()))
+        })
+        return months
+
+    def read(self, columns=None, limit=None):
+        """Load the snapshot (oldest month first) as a compact DataFrame, reading at most ``limit`` rows"""
+        manifest = self.load_manifest()
+        if manifest is None:
+            raise SnapshotNotFoundError(f"No snapshot in {self.root}; run snapshot_store.py refresh first")
+        columns = columns or SNAPSHOT_SCHEMA.names
+        tables = []
+        rows = 0
+        for key in manifest['partitions']:
+            if limit is not None and rows >= limit:
+                break
+            table = pq.read_table(
+                self._partition_path(key),
+                columns=columns,
+                memory_map=True,
+                # Low-cardinality columns come back dictionary-encoded, i.e. as categoricals
+                read_dictionary=[column for column in columns if column in CATEGORICAL_COLUMNS]
+            )
+            if limit is not None:
+                table = table.slice(0, limit - rows)
+            tables.append(table)
+            rows += table.num_rows
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        table = pa.concat_tables(tables)
+        df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get, self_destruct=True)
+        return compact_transactions(df)
+
+    def pair_counts(self, account_ids=None):
+        """Transaction counts per (from, to) account pair, optionally only pairs touching ``account_ids``"""
+        df = self.read(['from_account_id', 'to_account_id'])
+        if account_ids is not None:
+            df = df[df['from_account_id'].isin(account_ids) | df['to_account_id'].isin(account_ids)]
+        return (
+            df.groupby(['from_account_id', 'to_account_id'], observed=True, sort=False)
+            .size()
+            .reset_index(name='tx_count')
+            .astype({'from_account_id': str, 'to_account_id': str})
+        )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the columnar snapshot of the transactions view")
+    parser.add_argument('command', choices=['refresh', 'info'])
+    parser.add_argument('--full', action='store_true', help="Rewrite every month instead of only changed ones")
+    parser.add_argument('--snapshot-dir', default=None, help="Snapshot directory (defaults to SNAPSHOT_DIR)")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.snapshot_dir)
+    if args.command == 'refresh':
+        months = store.refresh(full=args.full)
+        print(f"Refreshed {len(months)} month(s): {', '.join(months) or 'none'}")
+    else:
+        print(json.dumps(store.load_manifest(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
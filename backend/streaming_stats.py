@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# A spread below this (or below this fraction of the mean's magnitude) is treated as noise, so a
+# near-constant history cannot turn an ordinary deviation into an unbounded z-score
+MIN_STD = 1.0
+STD_FLOOR_FRACTION = float(os.getenv('STATS_STD_FLOOR_FRACTION', '0.1'))
+# Scores are capped here; results are stored as DECIMAL(5,2)
+MAX_Z_SCORE = float(os.getenv('STATS_MAX_Z_SCORE', '100'))
+
+
+class WelfordAccumulator:
+    """Running count/mean/M2 over a fixed number of features (Welford, with Chan's merge for batches)"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, n_features=1):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (x - self.mean)
+
+    def merge_moments(self, count, mean, m2):
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = count, np.array(mean, dtype=float), np.array(m2, dtype=float)
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def update_batch(self, X):
+        X = np.asarray(X, dtype=float).reshape(len(X), -1)
+        if len(X):
+            mean = X.mean(axis=0)
+            self.merge_moments(len(X), mean, ((X - mean) ** 2).sum(axis=0))
+
+    def merge(self, other):
+        self.merge_moments(other.count, other.mean, other.m2)
+        return self
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return np.ones_like(self.mean)
+        std = np.sqrt(self.m2 / (self.count - 1))
+        return np.maximum(std, np.maximum(STD_FLOOR_FRACTION * np.abs(self.mean), MIN_STD))
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean.tolist(), 'm2': self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        acc = cls(len(data['mean']))
+        acc.count = data['count']
+        acc.mean = np.array(data['mean'], dtype=float)
+        acc.m2 = np.array(data['m2'], dtype=float)
+        return acc
+
+
+class StreamingStatisticalDetector:
+    """Online z-score detector over running global and per-account statistics.
+
+    The global accumulator covers every model feature; per-account accumulators
+    track the raw amount. A transaction's score is the largest absolute z-score
+    against either, capped at ``MAX_Z_SCORE``, and costs O(1) per row
+    regardless of history size. Callers fold in only rows not seen before
+    (the detector uses the feature store's replay check). ``model_version`` names the model whose scaler the global
+    statistics were accumulated under.
+    """
+
+    def __init__(self, features, min_account_count=5, path=None, checkpoint_interval=None):
+        self.features = list(features)
+        self.min_account_count = min_account_count
+        self.global_stats = WelfordAccumulator(len(self.features))
+        self.account_stats = {}
+        self.model_version = None
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval if checkpoint_interval is not None else \
+            float(os.getenv('STATS_CHECKPOINT_SECONDS', '300'))
+        self.last_checkpoint = time.monotonic()
+        self.lock = threading.Lock()
+
+    def score(self, X, accounts=None, amounts=None):
+        """Max absolute z-score per row against the current state (state is not modified)"""
+        values = np.asarray(X[self.features], dtype=float)
+        with self.lock:
+            scores = (np.abs(values - self.global_stats.mean) / self.global_stats.std).max(axis=1)
+            if accounts is not None and amounts is not None and self.account_stats:
+                codes, uniques = pd.factorize(pd.Series(accounts).astype(str))
+                means = np.zeros(len(uniques))
+                stds = np.ones(len(uniques))
+                known = np.zeros(len(uniques), dtype=bool)
+                for i, account in enumerate(uniques):
+                    acc = self.account_stats.get(account)
+                    if acc is not None and acc.count >= self.min_account_count:
+                        means[i], stds[i], known[i] = acc.mean[0], acc.std[0], True
+                amounts = np.asarray(amounts, dtype=float)
+                account_scores = np.where(known[codes], np.abs(amounts - means[codes]) / stds[codes], 0.0)
+                scores = np.maximum(scores, account_scores)
+        return pd.Series(np.minimum(scores, MAX_Z_SCORE), index=X.index)
+
+    def score_rows(self, values, accounts, amounts):
+        """``score()`` for a handful of rows given as an array in ``features`` order, without pandas"""
+        values = np.asarray(values, dtype=float)
+        with self.lock:
+            scores = (np.abs(values - self.global_stats.mean) / self.global_stats.std).max(axis=1)
+            for i, (account, amount) in enumerate(zip(accounts, amounts)):
+                acc = self.account_stats.get(str(account))
+                if acc is not None and acc.count >= self.min_account_count:
+                    scores[i] = max(scores[i], abs(float(amount) - acc.mean[0]) / acc.std[0])
+        return np.minimum(scores, MAX_Z_SCORE)
+
+    def update(self, X, accounts=None, amounts=None):
+        """Fold a batch into the global and per-account accumulators"""
+        values = np.asarray(X[self.features], dtype=float)
+        with self.lock:
+            if not len(values):
+                return
+            self.global_stats.update_batch(values)
+            if accounts is None or amounts is None:
+                return
+            grouped = pd.DataFrame({
+                'account': pd.Series(accounts).astype(str).to_numpy(),
+                'amount': np.asarray(amounts, dtype=float)
+            }).groupby('account')['amount']
+            moments = pd.DataFrame({
+                'count': grouped.count(),
+                'mean': grouped.mean(),
+                'm2': grouped.var(ddof=0) * grouped.count()
+            })
+            for account, count, mean, m2 in moments.itertuples():
+                acc = self.account_stats.get(account)
+                if acc is None:
+                    acc = self.account_stats[account] = WelfordAccumulator(1)
+                acc.merge_moments(int(count), np.array([mean]), np.array([m2]))
+
+    def merge(self, other):
+        """Merge another shard's state into this one"""
+        if other.features != self.features:
+            raise ValueError(f"Cannot merge statistics over {other.features} into {self.features}")
+        with self.lock:
+            self.global_stats.merge(other.global_stats)
+            for account, acc in other.account_stats.items():
+                mine = self.account_stats.get(account)
+                if mine is None:
+                    self.account_stats[account] = WelfordAccumulator.from_dict(acc.to_dict())
+                else:
+                    mine.merge(acc)
+        return self
+
+    def carry_over_accounts(self, other):
+        """Copy ``other``'s per-account statistics, which track raw amounts and so stay valid across models"""
+        with other.lock:
+            accounts = {account: acc.to_dict() for account, acc in other.account_stats.items()}
+        with self.lock:
+            self.account_stats = {account: WelfordAccumulator.from_dict(acc) for account, acc in accounts.items()}
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'features': self.features,
+                'min_account_count': self.min_account_count,
+                'model_version': self.model_version,
+                'global': self.global_stats.to_dict(),
+                'accounts': {account: acc.to_dict() for account, acc in self.account_stats.items()}
+            }
+
+    @classmethod
+    def from_dict(cls, data, path=None):
+        detector = cls(data['features'], data.get('min_account_count', 5), path=path)
+        detector.model_version = data.get('model_version')
+        detector.global_stats = WelfordAccumulator.from_dict(data['global'])
+        detector.account_stats = {
+            account: WelfordAccumulator.from_dict(acc) for account, acc in data['accounts'].items()
+        }
+        return detector
+
+    def checkpoint(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+        self.last_checkpoint = time.monotonic()
+        logger.info(f"Checkpointed streaming statistics ({len(self.account_stats)} accounts) to {path}")
+
+    def maybe_checkpoint(self):
+        if self.path and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    @staticmethod
+    def default_path():
+        return os.getenv('STATS_STATE_PATH',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state', 'streaming_stats.json'))
+
+    @classmethod
+    def load(cls, path=None):
+        """Restore state from ``path``; returns None when there is no checkpoint"""
+        path = path or cls.default_path()
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            detector = cls.from_dict(json.load(f), path=path)
+        logger.info(f"Loaded streaming statistics with {len(detector.account_stats)} accounts from {path}")
+        return detector
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Fast synthetic accounts/transactions generator for load testing.
+
+Produces rows matching 01-create-database.sql with injected fraud patterns
+(circular flows, fan-out mules, bursts, large amounts), chunk by chunk so
+memory stays bounded, and writes them through COPY or to Parquet:
+
+    python synthetic_data.py --transactions 10000000 --output postgres
+    python synthetic_data.py --transactions 10000000 --output parquet --path data/synthetic
+"""
+
+import argparse
+import binascii
+import io
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+from typed_frames import compact_transactions, concat_compact
+
+load_dotenv()
+
+TRANSACTION_TYPES = np.array(['transfer', 'payment', 'withdrawal', 'deposit'])
+TRANSACTION_TYPE_WEIGHTS = [0.4, 0.35, 0.15, 0.1]
+ACCOUNT_TYPES = np.array(['checking', 'savings', 'business'])
+
+ACCOUNT_COLUMNS = ['id', 'account_number', 'account_type', 'balance', 'created_at', 'is_suspicious', 'risk_score']
+TRANSACTION_COLUMNS = ['id', 'from_account_id', 'to_account_id', 'amount', 'transaction_type', 'timestamp',
+                       'description', 'is_anomaly', 'anomaly_score', 'anomaly_reasons']
+
+# Pattern label stored next to each generated transaction ('' for normal traffic)
+PATTERNS = ('large_amount', 'burst', 'fan_out', 'circular')
+
+
+def random_uuids(rng, n):
+    """``n`` random version-4 UUID strings, generated without a Python-level loop"""
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    hex_chars = np.frombuffer(binascii.hexlify(raw.tobytes()), dtype=np.uint8).reshape(n, 32)
+    out = np.full((n, 36), ord('-'), dtype=np.uint8)
+    out[:, 0:8] = hex_chars[:, 0:8]
+    out[:, 9:13] = hex_chars[:, 8:12]
+    out[:, 14:18] = hex_chars[:, 12:16]
+    out[:, 19:23] = hex_chars[:, 16:20]
+    out[:, 24:36] = hex_chars[:, 20:32]
+    return out.view('S36').ravel().astype(str)
+
+
+class SyntheticDataGenerator:
+    def __init__(self, transactions, accounts=None, days=180, start=None, chunk_size=1_000_000, seed=42,
+                 large_amount_rate=0.002, burst_rate=0.002, fan_out_rate=0.002, circular_rate=0.002,
+                 label_anomalies=False):
+        self.transactions = transactions
+        self.accounts = accounts or max(transactions // 20, 10)
+        self.days = days
+        self.start = np.datetime64(start or '2024-01-01T00:00:00', 's')
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.rates = {
+            'large_amount': large_amount_rate,
+            'burst': burst_rate,
+            'fan_out': fan_out_rate,
+            'circular': circular_rate
+        }
+        self.label_anomalies = label_anomalies
+        rng = np.random.default_rng(seed)
+        self.account_ids = random_uuids(rng, self.accounts)
+        self.account_numbers = np.char.add('SYN', np.char.zfill(np.arange(self.accounts).astype(str), 10))
+        # Zipf-like activity so a few accounts are much busier than the rest
+        weights = 1.0 / np.arange(1, self.accounts + 1) ** 0.8
+        self.account_cdf = np.cumsum(rng.permutation(weights / weights.sum()))
+
+    def sample_accounts(self, rng, n):
+        return np.minimum(np.searchsorted(self.account_cdf, rng.random(n)), self.accounts - 1)
+
+    def accounts_frame(self):
+        rng = np.random.default_rng(self.seed + 1)
+        return pd.DataFrame({
+            'id': self.account_ids,
+            'account_number': self.account_numbers,
+            'account_type': rng.choice(ACCOUNT_TYPES, self.accounts),
+            'balance': rng.lognormal(8.0, 1.5, self.accounts).round(2),
+            'created_at': self.start - rng.integers(0, 365 * 86400, self.accounts).astype('timedelta64[s]'),
+            'is_suspicious': False,
+            'risk_score': 0.0
+        })
+
+    def _normal(self, rng, n, t0, span):
+        from_idx = self.sample_accounts(rng, n)
+        to_idx = (from_idx + 1 + self.sample_accounts(rng, n)) % self.accounts
+        return {
+            'from': from_idx,
+            'to': to_idx,
+            'amount': rng.lognormal(4.0, 1.2, n),
+            'seconds': t0 + rng.integers(0, span, n),
+            'pattern': np.full(n, '', dtype=object)
+        }
+
+    def _bursts(self, rng, n, t0, span, size=20):
+        bursts = max(n // size, 1)
+        accounts = np.repeat(self.sample_accounts(rng, bursts), size)
+        starts = np.repeat(t0 + rng.integers(0, span, bursts), size)
+        return {
+            'from': accounts,
+            'to': rng.integers(0, self.accounts, bursts * size),
+            'amount': rng.lognormal(3.5, 0.5, bursts * size),
+            # All of a burst's transactions land within ten minutes
+            'seconds': starts + rng.integers(0, 600, bursts * size),
+            'pattern': np.full(bursts * size, 'burst', dtype=object)
+        }
+
+    def _fan_out(self, rng, n, t0, span, fan=15):
+        mules = max(n // (fan + 1), 1)
+        sources = rng.integers(0, self.accounts, mules)
+        mule_accounts = rng.integers(0, self.accounts, mules)
+        inbound = rng.lognormal(8.0, 0.5, mules)
+        starts = t0 + rng.integers(0, span, mules)
+        return {
+            'from': np.concatenate([sources, np.repeat(mule_accounts, fan)]),
+            'to': np.concatenate([mule_accounts, rng.integers(0, self.accounts, mules * fan)]),
+            'amount': np.concatenate([inbound, np.repeat(inbound / fan, fan) * rng.uniform(0.9, 1.0, mules * fan)]),
+            # Money leaves the mule within an hour of arriving
+            'seconds': np.concatenate([starts, np.repeat(starts, fan) + rng.integers(60, 3600, mules * fan)]),
+            'pattern': np.full(mules * (fan + 1), 'fan_out', dtype=object)
+        }
+
+    def _circular(self, rng, n, t0, span, length=4):
+        cycles = max(n // length, 1)
+        members = rng.integers(0, self.accounts, (cycles, length))
+        # Redraw cycles that visit an account twice, so no hop is a self-transfer and every cycle closes
+        repeated = (np.diff(np.sort(members, axis=1), axis=1) == 0).any(axis=1)
+        while repeated.any():
+            members[repeated] = rng.integers(0, self.accounts, (int(repeated.sum()), length))
+            repeated = (np.diff(np.sort(members, axis=1), axis=1) == 0).any(axis=1)
+        amounts = np.repeat(rng.lognormal(7.0, 0.7, cycles), length) * rng.uniform(0.97, 1.0, cycles * length)
+        starts = np.repeat(t0 + rng.integers(0, span, cycles), length)
+        # Each hop follows the previous one by 10 minutes to 2 hours
+        gaps = rng.integers(600, 7200, (cycles, length))
+        gaps[:, 0] = 0
+        hops = np.cumsum(gaps, axis=1).ravel()
+        return {
+            'from': members.ravel(),
+            'to': np.roll(members, -1, axis=1).ravel(),
+            'amount': amounts,
+            'seconds': starts + hops,
+            'pattern': np.full(cycles * length, 'circular', dtype=object)
+        }
+
+    def iter_chunks(self):
+        """Yield transaction chunks as DataFrames with account indices, each sorted by timestamp.
+
+        Chunk ``i`` starts its transactions in the ``i``-th consecutive slice of
+        the period, but the later hops of burst, fan-out and circular patterns
+        can fall up to a few hours past the slice end. Rows near a boundary may
+        therefore be later than the first rows of the next chunk; sort the
+        concatenated chunks when strict time order matters.
+        """
+        total_seconds = self.days * 86400
+        n_chunks = max((self.transactions + self.chunk_size - 1) // self.chunk_size, 1)
+        produced = 0
+        for chunk_no in range(n_chunks):
+            rng = np.random.default_rng([self.seed, chunk_no])
+            rows = min(self.chunk_size, self.transactions - produced)
+            t0 = total_seconds * chunk_no // n_chunks
+            span = max(total_seconds * (chunk_no + 1) // n_chunks - t0, 1)
+
+            injected = {pattern: int(rows * self.rates[pattern]) for pattern in ('burst', 'fan_out', 'circular')}
+            parts = [
+                self._bursts(rng, injected['burst'], t0, span) if injected['burst'] else None,
+                self._fan_out(rng, injected['fan_out'], t0, span) if injected['fan_out'] else None,
+                self._circular(rng, injected['circular'], t0, span) if injected['circular'] else None
+            ]
+            parts = [part for part in parts if part is not None]
+            normal_rows = max(rows - sum(len(part['from']) for part in parts), 0)
+            parts.insert(0, self._normal(rng, normal_rows, t0, span))
+            chunk = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+            chunk['to'] = np.where(chunk['to'] == chunk['from'], (chunk['to'] + 1) % self.accounts, chunk['to'])
+
+            large = rng.random(len(chunk['amount'])) < self.rates['large_amount']
+            chunk['amount'] = np.where(large, chunk['amount'] * rng.uniform(20, 100, len(large)), chunk['amount'])
+            chunk['pattern'] = np.where(large & (chunk['pattern'] == ''), 'large_amount', chunk['pattern'])
+
+            df = pd.DataFrame({
+                'from_idx': chunk['from'],
+                'to_idx': chunk['to'],
+                'amount': np.minimum(chunk['amount'], 9_999_999_999_999.99).round(2),
+                'timestamp': self.start + chunk['seconds'].astype('timedelta64[s]'),
+                'pattern': chunk['pattern']
+            }).sort_values('timestamp', kind='stable', ignore_index=True)
+            df['transaction_type'] = rng.choice(TRANSACTION_TYPES, len(df), p=TRANSACTION_TYPE_WEIGHTS)
+            df['id'] = random_uuids(rng, len(df))
+            produced += rows
+            yield df
+
+    def transactions_frame(self, chunk):
+        """A generated chunk in the shape of the ``transactions`` table (plus the ``pattern`` label)"""
+        is_anomaly = (chunk['pattern'] != '') if self.label_anomalies else np.zeros(len(chunk), dtype=bool)
+        return pd.DataFrame({
+            'id': chunk['id'],
+            'from_account_id': self.account_ids[chunk['from_idx']],
+            'to_account_id': self.account_ids[chunk['to_idx']],
+            'amount': chunk['amount'],
+            'transaction_type': chunk['transaction_type'],
+            'timestamp': chunk['timestamp'],
+            'description': 'Synthetic transaction',
+            'is_anomaly': is_anomaly,
+            'anomaly_score': 0.0,
+            'anomaly_reasons': '{}',
+            'pattern': chunk['pattern']
+        })
+
+    def detector_frame(self):
+        """All transactions in the joined shape ``TransactionAnomalyDetector.load_data`` returns"""
+        frames = [
+            compact_transactions(pd.DataFrame({
+                'id': chunk['id'],
+                'amount': chunk['amount'],
+                'transaction_type': chunk['transaction_type'],
+                'timestamp': chunk['timestamp'],
+                'from_account_id': self.account_ids[chunk['from_idx']],
+                'to_account_id': self.account_ids[chunk['to_idx']],
+                'from_account': self.account_numbers[chunk['from_idx']],
+                'to_account': self.account_numbers[chunk['to_idx']],
+                'pattern': pd.Categorical(chunk['pattern'])
+            }))
+            for chunk in self.iter_chunks()
+        ]
+        return concat_compact(frames)
+
+    def write_postgres(self, conn):
+        """Bulk-load accounts and transactions through COPY, one chunk per round trip"""
+        cursor = conn.cursor()
+        copy_frame(cursor, 'accounts', self.accounts_frame()[ACCOUNT_COLUMNS])
+        conn.commit()
+        rows = 0
+        for chunk in self.iter_chunks():
+            copy_frame(cursor, 'transactions', self.transactions_frame(chunk)[TRANSACTION_COLUMNS])
+            conn.commit()
+            rows += len(chunk)
+            print(f"Copied {rows:,} transactions")
+        cursor.close()
+        return rows
+
+    def write_parquet(self, path):
+        """Write ``accounts.parquet`` and ``transactions.parquet`` (with the pattern label) under ``path``"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(path, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(self.accounts_frame(), preserve_index=False),
+                       os.path.join(path, 'accounts.parquet'))
+        writer = None
+        rows = 0
+        try:
+            for chunk in self.iter_chunks():
+                table = pa.Table.from_pandas(self.transactions_frame(chunk), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(path, 'transactions.parquet'), table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+                print(f"Wrote {rows:,} transactions")
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+
+def copy_frame(cursor, table, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic accounts and transactions for load testing")
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--accounts', type=int, default=None, help="Defaults to transactions / 20")
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--start', default='2024-01-01T00:00:00')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    for pattern in PATTERNS:
+        parser.add_argument(f"--{pattern.replace('_', '-')}-rate", type=float, default=0.002,
+                            help=f"Share of transactions injected as the {pattern} pattern")
+    parser.add_argument('--label-anomalies', action='store_true',
+                        help="Set is_anomaly on injected transactions (ground truth instead of detector output)")
+    parser.add_argument('--output', choices=['postgres', 'parquet'], default='postgres')
+    parser.add_argument('--path', default='data/synthetic', help="Output directory for --output parquet")
+    args = parser.parse_args()
+
+    generator = SyntheticDataGenerator(
+        args.transactions, accounts=args.accounts, days=args.days, start=args.start,
+        chunk_size=args.chunk_size, seed=args.seed,
+        large_amount_rate=args.large_amount_rate, burst_rate=args.burst_rate,
+        fan_out_rate=args.fan_out_rate, circular_rate=args.circular_rate,
+        label_anomalies=args.label_anomalies
+    )
+
+    start = time.perf_counter()
+    if args.output == 'parquet':
+        rows = generator.write_parquet(args.path)
+    else:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            database=os.getenv('DB_NAME', 'transaction_db'),
+            user=os.getenv('DB_USER', 'postgres'),
+            password=os.getenv('DB_PASSWORD', ''),
+            port=os.getenv('DB_PORT', '5432')
+        )
+        try:
+            rows = generator.write_postgres(conn)
+        finally:
+            conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"Generated {rows:,} transactions and {generator.accounts:,} accounts in {elapsed:.1f}s "
+          f"({rows / elapsed:,.0f} rows/s) at {datetime.now().isoformat()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import numpy as np
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+from inline_models import InlineForests
+
+
+def test_inline_forests_match_scikit_learn():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 6)).astype(np.float32)
+    X[:20] += 6
+    y = X[:, 0] + X[:, 1] > 1.5
+    isolation_forest = IsolationForest(contamination=0.01, random_state=42).fit(X)
+    random_forest = RandomForestClassifier(n_estimators=50, random_state=42).fit(X, y)
+
+    inline = InlineForests(isolation_forest, random_forest)
+    sample = rng.normal(size=(300, 6)).astype(np.float32) * 2
+
+    np.testing.assert_array_equal(inline.ml_scores(sample), -isolation_forest.predict(sample))
+    np.testing.assert_allclose(inline.supervised_scores(sample), random_forest.predict_proba(sample)[:, 1])
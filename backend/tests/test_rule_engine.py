@@ -0,0 +1,65 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from rule_engine import RuleEngine
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), '..', 'rules.json')
+
+
+@pytest.fixture
+def copy_on_write():
+    major = int(pd.__version__.split('.')[0])
+    if major < 2:
+        pytest.skip("copy-on-write needs pandas 2 or later")
+    if major >= 3:
+        # Always on from pandas 3
+        yield
+        return
+    with pd.option_context('mode.copy_on_write', True):
+        yield
+
+
+def transactions(rows):
+    return pd.DataFrame(rows, columns=['from_account', 'to_account', 'amount', 'transaction_type', 'timestamp'])
+
+
+def write_rules(tmp_path, rules):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'rules': rules}))
+    return RuleEngine(str(path))
+
+
+def test_multi_condition_rule_on_copy_on_write_frame(tmp_path, copy_on_write):
+    engine = write_rules(tmp_path, [{
+        'name': 'large_transfer',
+        'when': [
+            {'field': 'amount', 'op': '>', 'value': 100},
+            {'field': 'transaction_type', 'op': 'in', 'value': ['transfer']}
+        ]
+    }])
+    df = transactions([
+        ('A', 'B', 500.0, 'transfer', '2024-01-01 10:00'),
+        ('A', 'C', 500.0, 'payment', '2024-01-01 10:05'),
+        ('B', 'C', 50.0, 'transfer', '2024-01-01 10:10')
+    ])
+
+    result = engine.evaluate(df)
+
+    assert result['rule_based'].tolist() == [True, False, False]
+    assert engine.stats()['rules'][0]['errors'] == 0
+
+
+def test_night_large_transfer_stops_before_5am(copy_on_write):
+    engine = RuleEngine(RULES_PATH)
+    df = transactions([
+        ('A', 'B', 20000.0, 'transfer', '2024-01-01 00:00'),
+        ('A', 'C', 20000.0, 'transfer', '2024-01-01 04:59'),
+        ('B', 'C', 20000.0, 'transfer', '2024-01-01 05:00')
+    ])
+
+    hits = engine.evaluate(df)['rule_hits'].tolist()
+
+    assert ['night_large_transfer' in (row or []) for row in hits] == [True, True, False]
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Train the anomaly detection models and publish them to the model store.
+
+Intended to be run on a schedule (cron, systemd timer, ...), separately from
+detection, e.g.:
+
+    python train_models.py --limit 100000
+"""
+
+import argparse
+
+from anomaly_detector import TransactionAnomalyDetector
+from model_store import ModelStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and publish anomaly detection models")
+    parser.add_argument('--limit', type=int, default=10000, help="Number of transactions to train on")
+    parser.add_argument('--model-dir', default=None, help="Model store directory (defaults to MODEL_DIR)")
+    args = parser.parse_args()
+
+    detector = TransactionAnomalyDetector(None, model_store=ModelStore(args.model_dir))
+    version = detector.train(limit=args.limit)
+    print(f"Trained model version {version}")
+
+
+if __name__ == "__main__":
+    main()
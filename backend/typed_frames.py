@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow  # noqa: F401
+    # Arrow-backed strings: one contiguous buffer instead of a Python object per id
+    ID_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    ID_DTYPE = object
+
+# Low-cardinality columns that repeat across rows
+CATEGORICAL_COLUMNS = ['transaction_type', 'from_account', 'to_account', 'from_account_id', 'to_account_id']
+FLOAT_COLUMNS = ['amount', 'anomaly_score']
+BOOL_COLUMNS = ['is_anomaly']
+
+
+def compact_transactions(df):
+    """Convert a joined transactions frame to compact dtypes, in place.
+
+    Account numbers/ids and transaction types become categoricals, amounts and
+    scores float32, ids Arrow strings, and ``timestamp`` datetime64[ns] (an int64
+    epoch in nanoseconds), instead of Python str/Decimal/datetime objects.
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str).astype('category')
+    for column in FLOAT_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype(np.float64).astype(np.float32)
+    for column in BOOL_COLUMNS:
+        if column in df:
+            df[column] = df[column].fillna(False).astype(bool)
+    if 'timestamp' in df:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    if 'id' in df and df['id'].dtype != ID_DTYPE:
+        df['id'] = df['id'].astype(str).astype(ID_DTYPE)
+    return df
+
+
+def concat_compact(frames):
+    """Concatenate compacted frames, merging categoricals instead of falling back to object"""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    categorical = {
+        column: union_categoricals([frame[column] for frame in frames])
+        for column in frames[0].columns if isinstance(frames[0][column].dtype, pd.CategoricalDtype)
+    }
+    df = pd.concat([frame.drop(columns=list(categorical)) for frame in frames], ignore_index=True)
+    for column, values in categorical.items():
+        df[column] = values
+    return df[frames[0].columns]
+
+
+def read_compact(query, conn, params=None, chunksize=100000):
+    """``pd.read_sql`` in chunks, compacting each one so only a chunk is ever held as Python objects"""
+    chunks = pd.read_sql(query, conn, params=params, chunksize=chunksize)
+    return concat_compact([compact_transactions(chunk) for chunk in chunks])
+
+
+def memory_per_row(df):
+    """Deep memory usage in bytes per row, for comparing representations"""
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
@@ -514,19 +514,19 @@ const AnomalyDashboard = () => {
                         <div className="flex justify-between items-center p-3 bg-slate-50 rounded-lg">
                           <span className="text-sm text-slate-600">Statistical Methods</span>
                           <span className="font-mono font-semibold text-slate-900">
-                            {analyticsData.statistical_latency?.toFixed(1) || 0}s
+                            {analyticsData.statistical_latency?.toFixed(1) || 0}ms
                           </span>
                         </div>
                         <div className="flex justify-between items-center p-3 bg-slate-50 rounded-lg">
                           <span className="text-sm text-slate-600">ML Models</span>
                           <span className="font-mono font-semibold text-slate-900">
-                            {analyticsData.ml_latency?.toFixed(1) || 0}s
+                            {analyticsData.ml_latency?.toFixed(1) || 0}ms
                           </span>
                         </div>
                         <div className="flex justify-between items-center p-3 bg-slate-50 rounded-lg">
                           <span className="text-sm text-slate-600">Network Analysis</span>
                           <span className="font-mono font-semibold text-slate-900">
-                            {analyticsData.network_latency?.toFixed(1) || 0}s
+                            {analyticsData.network_latency?.toFixed(1) || 0}ms
                           </span>
                         </div>
                       </div>
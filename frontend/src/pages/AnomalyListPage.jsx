@@ -10,16 +10,28 @@ import { ChevronLeft, ChevronRight } from 'lucide-react';
 const AnomalyListPage = () => {
   const [statusFilter, setStatusFilter] = useState('all');
   const [page, setPage] = useState(1);
+  // Keyset cursor that starts each visited page, so paging costs the same at any depth
+  const [cursors, setCursors] = useState({ 1: null });
   const [anomalies, setAnomalies] = useState([]);
   const limit = 10;
 
-  const { data, loading, error } = useApi(() => apiService.getAnomalies(page, limit, statusFilter), [page, statusFilter]);
+  const { data, loading, error } = useApi(
+    () => apiService.getAnomalies(page, limit, statusFilter, cursors[page]),
+    [page, statusFilter]
+  );
 
   useEffect(() => {
     if (data) {
       setAnomalies(data.anomalies);
+      setCursors(prev => ({ ...prev, [page + 1]: data.next_cursor }));
     }
-  }, [data]);
+  }, [data, page]);
+
+  const changeStatusFilter = (value) => {
+    setCursors({ 1: null });
+    setPage(1);
+    setStatusFilter(value);
+  };
 
   const [selectedAnomaly, setSelectedAnomaly] = useState(null);
 
@@ -34,7 +46,7 @@ const AnomalyListPage = () => {
         <CardHeader>
           <CardTitle>Anomaly List</CardTitle>
           <div className="flex items-center justify-between">
-            <Select value={statusFilter} onValueChange={setStatusFilter}>
+            <Select value={statusFilter} onValueChange={changeStatusFilter}>
               <SelectTrigger className="w-[180px]">
                 <SelectValue placeholder="Filter by status" />
               </SelectTrigger>
@@ -62,7 +74,7 @@ const AnomalyListPage = () => {
                 variant="outline"
                 size="sm"
                 onClick={() => setPage(prev => Math.min(prev + 1, totalPages))}
-                disabled={page === totalPages}
+                disabled={page === totalPages || !data?.next_cursor}
               >
                 <ChevronRight className="h-4 w-4" />
               </Button>
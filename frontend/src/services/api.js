@@ -58,10 +58,11 @@ export const apiService = {
     }
   },
 
-  getTransactions: async (page = 1, limit = 50, status = null) => {
+  getTransactions: async (page = 1, limit = 50, status = null, cursor = null) => {
     try {
       const params = { page, limit };
       if (status) params.status = status;
+      if (cursor) params.cursor = cursor;
       const response = await apiClient.get('/transactions', { params });
       return response.data;
     } catch (error) {
@@ -70,11 +71,11 @@ export const apiService = {
     }
   },
 
-  getAnomalies: async (page = 1, limit = 50, status = 'all') => {
+  getAnomalies: async (page = 1, limit = 50, status = 'all', cursor = null) => {
     try {
-      const response = await apiClient.get('/anomalies', {
-        params: { page, limit, status }
-      });
+      const params = { page, limit, status };
+      if (cursor) params.cursor = cursor;
+      const response = await apiClient.get('/anomalies', { params });
       return response.data;
     } catch (error) {
       console.error('Failed to fetch anomalies:', error);